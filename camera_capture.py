@@ -0,0 +1,264 @@
+import cv2
+import threading
+import time
+import logging
+from resource_config import pin_current_thread
+
+logger = logging.getLogger(__name__)
+
+class CameraCapture:
+    """Camera reader with a dedicated grab thread that always exposes the newest frame"""
+
+    def __init__(self, source=0, width=0, height=0, fps=0, fourcc='', buffer_size=1,
+                 loop=True, realtime=None, max_failures=10, reconnect_delay=0.5,
+                 max_reconnect_delay=10.0):
+        """
+        Create a camera capture.
+
+        Args:
+            source: Camera index or video file path
+            width: Requested frame width (0 keeps the driver default)
+            height: Requested frame height (0 keeps the driver default)
+            fps: Requested frame rate (0 keeps the driver default)
+            fourcc: Requested pixel format, e.g. 'MJPG' (blank keeps the default)
+            buffer_size: Driver-side frame buffer (CAP_PROP_BUFFERSIZE); 0 leaves it alone
+            loop: Rewind video files when they end
+            realtime: Pace video files at their own frame rate so they behave like
+                a camera; defaults to True for files
+            max_failures: Consecutive failed reads before the camera is reopened
+            reconnect_delay: First delay in seconds between reconnect attempts
+            max_reconnect_delay: Upper bound for the doubling reconnect delay
+        """
+        self.source = source
+        self.is_file = isinstance(source, str) and not source.isdigit()
+        if isinstance(source, str) and source.isdigit():
+            self.source = int(source)
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = float(fps)
+        self.fourcc = fourcc
+        self.buffer_size = int(buffer_size)
+        self.loop = loop
+        self.realtime = self.is_file if realtime is None else realtime
+        self.max_failures = max_failures
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.cap = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.condition = threading.Condition()
+        self.frame = None
+        self.timestamp = 0.0
+        self.sequence = 0
+        self.delivered_sequence = 0
+        self.connected = False
+        self.ended = False
+        self.frame_interval = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Clear capture counters"""
+        self.stats = {
+            'grabbed': 0,
+            'delivered': 0,
+            'dropped': 0,
+            'read_failures': 0,
+            'reconnects': 0
+        }
+        self.measured_fps = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_grab = None
+
+    def _open(self):
+        """Open the source and apply the requested properties"""
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return False
+
+        if not self.is_file:
+            # FOURCC first: many drivers only offer high resolutions as MJPG
+            if self.fourcc:
+                cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+            if self.width:
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            if self.height:
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            if self.fps:
+                cap.set(cv2.CAP_PROP_FPS, self.fps)
+            if self.buffer_size:
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+            logger.info(f"Camera {self.source} opened at "
+                        f"{int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))} "
+                        f"{cap.get(cv2.CAP_PROP_FPS):.1f} fps")
+
+        self.frame_interval = 0.0
+        if self.realtime:
+            fps = self.fps or cap.get(cv2.CAP_PROP_FPS) or 30.0
+            self.frame_interval = 1.0 / fps
+        self.cap = cap
+        return True
+
+    def _close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def start(self):
+        """
+        Open the source and start the grab thread.
+
+        Returns:
+            bool: True if the source opened; otherwise the thread keeps retrying
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return self.connected
+        self.stop_event.clear()
+        self.ended = False
+        self.connected = self._open()
+        if not self.connected:
+            logger.warning(f"Cannot open video source {self.source}; retrying in the background")
+        self.thread = threading.Thread(target=self._run, name='CameraCapture', daemon=True)
+        self.thread.start()
+        return self.connected
+
+    def stop(self, timeout=2.0):
+        """Stop the grab thread and release the source"""
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self._close()
+        self.connected = False
+
+    def release(self):
+        """Alias of stop() so the capture can replace cv2.VideoCapture"""
+        self.stop()
+
+    def is_running(self):
+        """True while the grab thread is alive"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self):
+        """Grab loop: read continuously, reconnecting with backoff on failure"""
+        pin_current_thread('capture')
+        delay = self.reconnect_delay
+        failures = 0
+        next_due = time.monotonic()
+        while not self.stop_event.is_set():
+            if self.cap is None:
+                if self.stop_event.wait(delay):
+                    break
+                if not self._open():
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    continue
+                logger.info(f"Video source {self.source} reconnected")
+                self.stats['reconnects'] += 1
+                self.connected = True
+                delay = self.reconnect_delay
+                failures = 0
+
+            if self.frame_interval:
+                # Video files would otherwise be read as fast as they decode
+                wait = next_due - time.monotonic()
+                if wait > 0 and self.stop_event.wait(wait):
+                    break
+                next_due = max(next_due + self.frame_interval, time.monotonic() - self.frame_interval)
+
+            ret, frame = self.cap.read()
+            if not ret:
+                failures += 1
+                if self.is_file:
+                    if self.loop and failures == 1:
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    # End of file (or a file that cannot be rewound)
+                    self.ended = True
+                    break
+                self.stats['read_failures'] += 1
+                if failures >= self.max_failures:
+                    logger.warning(f"Video source {self.source} stopped delivering frames; reconnecting")
+                    self._close()
+                    self.connected = False
+                else:
+                    self.stop_event.wait(0.01)
+                continue
+
+            failures = 0
+            now = time.monotonic()
+            if self.last_grab is not None and now > self.last_grab:
+                rate = 1.0 / (now - self.last_grab)
+                self.measured_fps = rate if not self.measured_fps else 0.9 * self.measured_fps + 0.1 * rate
+            self.last_grab = now
+
+            with self.condition:
+                if self.sequence > self.delivered_sequence:
+                    # The previous frame was never read; it is replaced, not queued
+                    self.stats['dropped'] += 1
+                # Every grab is a fresh array, so readers may keep or modify it
+                self.frame = frame
+                self.timestamp = now
+                self.sequence += 1
+                self.stats['grabbed'] += 1
+                self.condition.notify_all()
+
+        with self.condition:
+            self.condition.notify_all()
+
+    def latest(self, timeout=None):
+        """
+        Get the newest frame that has not been returned yet.
+
+        Args:
+            timeout: Seconds to wait for a new frame (None waits indefinitely)
+
+        Returns:
+            tuple: (frame, grab timestamp), or (None, None) if no new frame arrived
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.sequence == self.delivered_sequence:
+                if self.ended or self.stop_event.is_set() or not self.is_running():
+                    return None, None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None, None
+                self.condition.wait(remaining)
+            self.delivered_sequence = self.sequence
+            frame, timestamp = self.frame, self.timestamp
+
+        latency = time.monotonic() - timestamp
+        self.stats['delivered'] += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        return frame, timestamp
+
+    def read(self, timeout=None):
+        """
+        cv2.VideoCapture-style read of the newest frame.
+
+        Returns:
+            tuple: (ret, frame)
+        """
+        frame, _ = self.latest(timeout)
+        return frame is not None, frame
+
+    def get_stats(self):
+        """
+        Capture statistics.
+
+        Returns:
+            dict: Frame counters, measured fps, average and worst frame age
+            at delivery (ms) and connection state
+        """
+        stats = dict(self.stats)
+        delivered = stats['delivered']
+        stats['fps'] = self.measured_fps
+        stats['average_latency_ms'] = 1000.0 * self.latency_total / delivered if delivered else 0.0
+        stats['max_latency_ms'] = 1000.0 * self.latency_max
+        stats['connected'] = self.connected
+        return stats
@@ -0,0 +1,159 @@
+import cv2
+import os
+import queue
+import threading
+import logging
+from utils import unique_filename
+
+logger = logging.getLogger(__name__)
+
+class CaptureWriter:
+    """Background encoder/writer for screenshots and evidence captures"""
+
+    # Supported output formats: extension -> OpenCV quality flag
+    FORMATS = {
+        'jpg': cv2.IMWRITE_JPEG_QUALITY,
+        'webp': cv2.IMWRITE_WEBP_QUALITY,
+        'png': None
+    }
+    DROP_POLICIES = ('oldest', 'newest')
+
+    def __init__(self, directory='screenshots', image_format='jpg', quality=90,
+                 max_backlog=8, drop_policy='oldest', max_backlog_bytes=None):
+        """
+        Create a capture writer.
+
+        Args:
+            directory: Output directory for captures
+            image_format: One of 'jpg', 'webp' or 'png'
+            quality: Encoder quality (1-100) for JPEG/WebP
+            max_backlog: Maximum number of captures waiting to be encoded
+            drop_policy: 'oldest' drops the oldest queued capture when full,
+                'newest' rejects the incoming one
+            max_backlog_bytes: Optional memory budget for queued frames
+        """
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.directory = directory
+        self.drop_policy = drop_policy
+        self.set_format(image_format, quality)
+
+        self.queue = queue.Queue(maxsize=max_backlog)
+        self.max_backlog_bytes = max_backlog_bytes
+        self.pending_bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {'written': 0, 'dropped': 0, 'failed': 0}
+        self.thread = None
+
+    def set_format(self, image_format, quality=90):
+        """Change the output format and quality for subsequent captures"""
+        image_format = image_format.lower().lstrip('.')
+        if image_format == 'jpeg':
+            image_format = 'jpg'
+        if image_format not in self.FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        self.image_format = image_format
+        self.quality = max(1, min(100, int(quality)))
+
+    def start(self):
+        """Start the background writer thread"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, name='CaptureWriter', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Flush pending captures and stop the writer thread"""
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def submit(self, frame, prefix='emotion', emotion=None, size=None):
+        """
+        Queue a frame for encoding and writing.
+
+        Args:
+            frame: Frame to save (BGR format); it is copied before queueing
+            prefix: Filename prefix
+            emotion: Optional emotion label appended to the filename
+            size: Optional (width, height) to scale to before encoding
+
+        Returns:
+            str: Filename the capture will be written to, or None if dropped
+        """
+        if frame is None or frame.size == 0:
+            return None
+
+        suffix = f"_{emotion}" if emotion else ''
+        filename = unique_filename(self.directory, prefix, self.image_format, suffix)
+        item = (frame.copy(), filename, size, self.image_format, self.quality)
+
+        while not self._try_put(item):
+            if self.drop_policy == 'newest':
+                self._count('dropped')
+                return None
+            # Make room by discarding the oldest pending capture
+            try:
+                self._release(self.queue.get_nowait())
+                self._count('dropped')
+            except queue.Empty:
+                # Nothing left to drop: the frame alone exceeds the budget
+                self._count('dropped')
+                return None
+        return filename
+
+    def _try_put(self, item):
+        """Queue an item if both the count and byte budgets allow it"""
+        nbytes = item[0].nbytes
+        with self.lock:
+            if (self.max_backlog_bytes and self.pending_bytes
+                    and self.pending_bytes + nbytes > self.max_backlog_bytes):
+                return False
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                return False
+            self.pending_bytes += nbytes
+            return True
+
+    def _release(self, item):
+        """Account for an item leaving the queue"""
+        if item is not None:
+            with self.lock:
+                self.pending_bytes -= item[0].nbytes
+
+    def pending(self):
+        """Number of captures waiting to be written"""
+        return self.queue.qsize()
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _run(self):
+        """Writer loop: encode and save queued captures"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            self._release(item)
+            frame, filename, size, image_format, quality = item
+            try:
+                if size is not None and (frame.shape[1], frame.shape[0]) != tuple(size):
+                    frame = cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+
+                flag = self.FORMATS[image_format]
+                params = [flag, quality] if flag is not None else []
+                ok, buffer = cv2.imencode(f'.{image_format}', frame, params)
+                if not ok:
+                    raise IOError(f"Encoding failed for {filename}")
+
+                os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+                with open(filename, 'wb') as f:
+                    f.write(buffer.tobytes())
+                self._count('written')
+            except Exception as e:
+                logger.error(f"Error writing capture {filename}: {str(e)}")
+                self._count('failed')
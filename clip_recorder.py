@@ -0,0 +1,360 @@
+import cv2
+import numpy as np
+import math
+import os
+import threading
+import time
+import logging
+from collections import deque
+from utils import unique_filename
+
+logger = logging.getLogger(__name__)
+
+class FrameRingBuffer:
+    """Fixed-size ring of recent frames backed by a single preallocated array"""
+
+    def __init__(self, capacity, max_bytes=None):
+        """
+        Create a frame ring buffer.
+
+        Args:
+            capacity: Number of frames to keep
+            max_bytes: Optional memory budget that further limits the capacity
+        """
+        self.requested_capacity = int(capacity)
+        self.max_bytes = max_bytes
+        self.capacity = self.requested_capacity
+        self.frames = None  # Allocated on the first frame, once its shape is known
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.sequences = np.full(self.capacity, -1, dtype=np.int64)
+        self.next_sequence = 0
+        self.lock = threading.Lock()
+
+    def _allocate(self, frame):
+        """Allocate frame storage, honouring the memory budget"""
+        capacity = self.requested_capacity
+        if self.max_bytes:
+            affordable = max(1, int(self.max_bytes // frame.nbytes))
+            if affordable < capacity:
+                logger.warning(f"Clip buffer limited to {affordable} frames by memory budget")
+                capacity = affordable
+        self.capacity = capacity
+        self.frames = np.empty((capacity,) + frame.shape, dtype=frame.dtype)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.sequences = np.full(capacity, -1, dtype=np.int64)
+
+    def push(self, frame, timestamp):
+        """
+        Copy a frame into the next slot.
+
+        Args:
+            frame: Frame (BGR format)
+            timestamp: Capture time in seconds
+
+        Returns:
+            int: Sequence number of the stored frame
+        """
+        with self.lock:
+            if self.frames is None or self.frames.shape[1:] != frame.shape:
+                # First frame or resolution change: start over with a fresh allocation
+                self._allocate(frame)
+            sequence = self.next_sequence
+            slot = sequence % self.capacity
+            np.copyto(self.frames[slot], frame)
+            self.timestamps[slot] = timestamp
+            self.sequences[slot] = sequence
+            self.next_sequence += 1
+            return sequence
+
+    def latest_sequence(self):
+        """Sequence number of the newest frame, or -1 if empty"""
+        with self.lock:
+            return self.next_sequence - 1
+
+    def find_sequence(self, since):
+        """
+        Find the oldest stored frame captured at or after a given time.
+
+        Args:
+            since: Timestamp in seconds
+
+        Returns:
+            int: Sequence number, or the next sequence if no frame qualifies
+        """
+        with self.lock:
+            oldest = max(0, self.next_sequence - self.capacity)
+            for sequence in range(oldest, self.next_sequence):
+                if self.timestamps[sequence % self.capacity] >= since:
+                    return sequence
+            return self.next_sequence
+
+    def read(self, sequence, out):
+        """
+        Copy a stored frame into a caller-owned buffer.
+
+        Args:
+            sequence: Sequence number to read
+            out: Destination array with the frame shape
+
+        Returns:
+            float: Frame timestamp, or None if it was already overwritten
+        """
+        with self.lock:
+            slot = sequence % self.capacity
+            if self.frames is None or self.sequences[slot] != sequence:
+                return None
+            if out.shape != self.frames.shape[1:]:
+                return None
+            np.copyto(out, self.frames[slot])
+            return float(self.timestamps[slot])
+
+    def frame_shape(self):
+        """Shape of stored frames, or None before the first frame"""
+        with self.lock:
+            return None if self.frames is None else self.frames.shape[1:]
+
+class EmotionTransitionTrigger:
+    """Detect debounced per-face transitions into trigger emotions"""
+
+    def __init__(self, trigger_emotions=('angry',), debounce=0.5, max_idle=5.0):
+        """
+        Create a transition trigger.
+
+        Args:
+            trigger_emotions: Emotions that fire a trigger when entered
+            debounce: Seconds a new emotion must persist before it counts
+            max_idle: Seconds after which an unseen face is forgotten
+        """
+        self.trigger_emotions = set(trigger_emotions)
+        self.debounce = debounce
+        self.max_idle = max_idle
+        # track id -> [stable emotion, candidate emotion, candidate since, last seen]
+        self.states = {}
+
+    def update(self, track_id, emotion, timestamp):
+        """
+        Feed the latest emotion of a face.
+
+        Args:
+            track_id: Stable face id from FaceTracker
+            emotion: Emotion detected in this frame
+            timestamp: Time in seconds
+
+        Returns:
+            tuple: (previous_emotion, new_emotion) when a trigger fires, else None
+        """
+        state = self.states.get(track_id)
+        if state is None:
+            # First sighting counts as a transition from nothing
+            self.states[track_id] = [None, emotion, timestamp, timestamp]
+            state = self.states[track_id]
+        state[3] = timestamp
+
+        stable, candidate, since, _ = state
+        if emotion == stable:
+            state[1], state[2] = emotion, timestamp
+            return None
+        if emotion != candidate:
+            state[1], state[2] = emotion, timestamp
+            candidate, since = emotion, timestamp
+
+        if timestamp - since >= self.debounce:
+            state[0] = candidate
+            if candidate in self.trigger_emotions:
+                return stable, candidate
+        return None
+
+    def prune(self, timestamp):
+        """Forget faces that have not been seen recently"""
+        stale = [tid for tid, state in self.states.items()
+                 if timestamp - state[3] > self.max_idle]
+        for tid in stale:
+            del self.states[tid]
+
+class ClipRecorder:
+    """Record short clips around events from a pre-roll ring buffer"""
+
+    def __init__(self, directory='clips', pre_roll=3.0, post_roll=3.0, max_fps=30.0,
+                 fourcc='mp4v', extension='mp4', max_bytes=None):
+        """
+        Create a clip recorder.
+
+        Args:
+            directory: Output directory for clips
+            pre_roll: Seconds of video kept before a trigger
+            post_roll: Seconds of video recorded after a trigger
+            max_fps: Highest expected frame rate, used to size the pre-roll ring buffer
+            fourcc: FOURCC code passed to cv2.VideoWriter
+            extension: Output file extension
+            max_bytes: Optional memory budget for the pre-roll ring buffer
+        """
+        self.directory = directory
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.fourcc = fourcc
+        self.extension = extension
+
+        # Pre-roll plus one second of slack for the writer; post-roll frames
+        # are read as they arrive, so they never need to be held back
+        capacity = int(math.ceil((pre_roll + 1.0) * max_fps))
+        self.ring = FrameRingBuffer(capacity, max_bytes)
+
+        self.jobs = deque()
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.active_job = None
+        self.stats = {'clips': 0, 'frames': 0, 'overwritten': 0, 'failed': 0}
+
+    def start(self):
+        """Start the background writer thread"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='ClipRecorder', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the writer thread, abandoning clips still waiting for post-roll"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def add_frame(self, frame, timestamp=None):
+        """
+        Add a captured frame to the pre-roll buffer.
+
+        Args:
+            frame: Frame (BGR format); it is copied into the ring
+            timestamp: Capture time in seconds (defaults to now)
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self.ring.push(frame, timestamp)
+        with self.condition:
+            self.condition.notify_all()
+
+    def trigger(self, label='event', timestamp=None):
+        """
+        Request a clip around the given moment.
+
+        A trigger that lands inside a clip still being recorded extends it
+        instead of starting an overlapping one.
+
+        Args:
+            label: Text appended to the clip filename
+            timestamp: Trigger time in seconds (defaults to now)
+
+        Returns:
+            str: Filename of the clip, or None if an existing clip was extended
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        with self.condition:
+            for job in ([self.active_job] if self.active_job else []) + list(self.jobs):
+                if job['start_time'] <= timestamp <= job['end_time']:
+                    job['end_time'] = max(job['end_time'], timestamp + self.post_roll)
+                    return None
+
+            filename = unique_filename(self.directory, 'clip', self.extension, f"_{label}")
+            self.jobs.append({
+                'filename': filename,
+                'start_time': timestamp - self.pre_roll,
+                'end_time': timestamp + self.post_roll
+            })
+            self.condition.notify_all()
+        return filename
+
+    def _run(self):
+        """Writer loop: stream queued clips from the ring to disk"""
+        while True:
+            with self.condition:
+                while self.running and not self.jobs:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                self.active_job = self.jobs.popleft()
+            try:
+                self._write_clip(self.active_job)
+            except Exception as e:
+                logger.error(f"Error writing clip {self.active_job['filename']}: {str(e)}")
+                self.stats['failed'] += 1
+            finally:
+                with self.condition:
+                    self.active_job = None
+
+    def _write_clip(self, job):
+        """Write one clip, waiting for post-roll frames as they arrive"""
+        shape = self.ring.frame_shape()
+        if shape is None:
+            return
+        buffer = np.empty(shape, dtype=np.uint8)
+        sequence = self.ring.find_sequence(job['start_time'])
+        writer = None
+        pending = []
+        first_timestamp = None
+
+        try:
+            while True:
+                with self.condition:
+                    while self.running and sequence > self.ring.latest_sequence():
+                        self.condition.wait(0.5)
+                    if not self.running:
+                        break
+
+                timestamp = self.ring.read(sequence, buffer)
+                sequence += 1
+                if timestamp is None:
+                    if self.ring.frame_shape() != shape:
+                        # Resolution changed: no later frame fits this clip, so end it here
+                        logger.warning(f"Frame size changed; clip {job['filename']} ends early")
+                        break
+                    # The producer lapped us; skip frames that are gone
+                    self.stats['overwritten'] += 1
+                    continue
+                if timestamp > job['end_time']:
+                    break
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+
+                if writer is None:
+                    # Hold the first frames to estimate the real frame rate
+                    pending.append((timestamp, buffer.copy()))
+                    if timestamp - first_timestamp < 1.0:
+                        continue
+                    writer = self._open_writer(job['filename'], pending, shape)
+                    for _, frame in pending:
+                        writer.write(frame)
+                        self.stats['frames'] += 1
+                    pending = []
+                else:
+                    writer.write(buffer)
+                    self.stats['frames'] += 1
+
+            if writer is None and pending:
+                writer = self._open_writer(job['filename'], pending, shape)
+                for _, frame in pending:
+                    writer.write(frame)
+                    self.stats['frames'] += 1
+        finally:
+            if writer is not None:
+                writer.release()
+                self.stats['clips'] += 1
+                logger.info(f"Clip saved: {job['filename']}")
+
+    def _open_writer(self, filename, frames, shape):
+        """Open a VideoWriter using the frame rate measured from buffered frames"""
+        fps = 15.0
+        if len(frames) > 1:
+            span = frames[-1][0] - frames[0][0]
+            if span > 0:
+                fps = (len(frames) - 1) / span
+        os.makedirs(self.directory, exist_ok=True)
+        writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*self.fourcc),
+                                 fps, (shape[1], shape[0]))
+        if not writer.isOpened():
+            raise IOError(f"Cannot open video writer for {filename}")
+        return writer
@@ -0,0 +1,254 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+logger = logging.getLogger(__name__)
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each bucket in between, the
+    point forming the largest triangle with the previously kept point and
+    the average of the next bucket, which preserves peaks and dips.
+
+    Args:
+        x: Monotonic x values
+        y: Values to downsample
+        threshold: Number of points to keep
+
+    Returns:
+        numpy.ndarray: Indices of the kept points
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        ax, ay = x[selected], y[selected]
+        areas = np.abs((ax - next_x) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y - ay))
+        selected = start + int(np.argmax(areas))
+        indices[i + 1] = selected
+    return indices
+
+class EmotionTimeSeries:
+    """Per-emotion detection counts in fixed-size time buckets on a NumPy ring"""
+
+    def __init__(self, emotions, capacity=3600, bucket_seconds=1.0):
+        """
+        Args:
+            emotions: Emotion names, one column each
+            capacity: Number of buckets kept (capacity * bucket_seconds of history)
+            bucket_seconds: Width of one bucket
+        """
+        self.emotions = list(emotions)
+        self.capacity = capacity
+        self.bucket_seconds = bucket_seconds
+        self.counts = np.zeros((capacity, len(self.emotions)), dtype=np.int32)
+        self.head = None  # Absolute bucket number of the newest bucket
+        self.lock = threading.Lock()
+
+    def _advance(self, bucket):
+        """Move the head forward, clearing buckets that are reused"""
+        if self.head is None:
+            self.head = bucket
+            return
+        if bucket <= self.head:
+            return
+        steps = min(bucket - self.head, self.capacity)
+        slots = (np.arange(self.head + 1, self.head + 1 + steps)) % self.capacity
+        self.counts[slots] = 0
+        self.head = bucket
+
+    def record(self, emotion, timestamp):
+        """Add one analyzed face"""
+        column = self.emotions.index(emotion)
+        bucket = int(timestamp // self.bucket_seconds)
+        with self.lock:
+            self._advance(bucket)
+            if self.head - bucket >= self.capacity:
+                return  # Older than the history we keep
+            slot = bucket % self.capacity
+            self.counts[slot, column] += 1
+
+    def window(self, seconds, now):
+        """
+        Copy out the most recent buckets in chronological order.
+
+        Args:
+            seconds: Window length
+            now: Current time on the same clock as record()
+
+        Returns:
+            tuple: (bucket times relative to now, counts per bucket and emotion)
+        """
+        size = min(self.capacity, max(1, int(np.ceil(seconds / self.bucket_seconds))))
+        with self.lock:
+            self._advance(int(now // self.bucket_seconds))
+            if self.head is None:
+                return np.zeros(0), np.zeros((0, len(self.emotions)), dtype=np.int32)
+            buckets = np.arange(self.head - size + 1, self.head + 1)
+            slots = buckets % self.capacity
+            counts = self.counts[slots]  # Fancy indexing already copies
+        times = buckets * self.bucket_seconds - now
+        return times, counts
+
+class DashboardRenderer:
+    """Render the mood dashboard with matplotlib (Agg) on a background thread"""
+
+    def __init__(self, series, colors, min_interval=1.0, max_points=200):
+        """
+        Args:
+            series: EmotionTimeSeries to plot
+            colors: Emotion -> RGB color with components in 0..1
+            min_interval: Minimum seconds between renders
+            max_points: Points per timeline after LTTB downsampling
+        """
+        self.series = series
+        self.colors = colors
+        self.min_interval = min_interval
+        self.max_points = max_points
+        self.condition = threading.Condition()
+        self.request = None
+        self.image = None  # Latest RGBA render as a NumPy array
+        self.image_id = 0
+        self.running = False
+        self.thread = None
+        self.last_render = 0.0
+        self.figure = None
+        self.figure_key = None
+
+    def start(self):
+        """Start the render thread"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='DashboardRenderer', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop the render thread"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def request_render(self, window, size, dark=True):
+        """
+        Ask for a new render; only the latest request is kept.
+
+        Args:
+            window: Seconds of history to show
+            size: (width, height) in pixels
+            dark: Use the dark theme colors
+        """
+        with self.condition:
+            self.request = (window, size, dark)
+            self.condition.notify_all()
+
+    def latest(self):
+        """Most recent render as (image id, RGBA array), or (0, None)"""
+        with self.condition:
+            return self.image_id, self.image
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and self.request is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                wait = self.last_render + self.min_interval - time.monotonic()
+                if wait > 0:
+                    # Throttle: requests arriving meanwhile replace this one
+                    self.condition.wait(wait)
+                    continue
+                request, self.request = self.request, None
+            try:
+                image = self.render(*request)
+            except Exception as e:
+                logger.error(f"Dashboard render failed: {str(e)}")
+                image = None
+            self.last_render = time.monotonic()
+            if image is not None:
+                with self.condition:
+                    self.image = image
+                    self.image_id += 1
+
+    def _build(self, width, height, dark):
+        """Create the figure and its artists; later renders only update data"""
+        dpi = 80
+        background, foreground = ('#2b2b2b', '#ffffff') if dark else ('#ffffff', '#000000')
+        figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi, facecolor=background)
+        FigureCanvasAgg(figure)
+        timeline, distribution = figure.subplots(2, 1, gridspec_kw={'height_ratios': [2, 1]})
+
+        emotions = self.series.emotions
+        self.lines = [timeline.plot([], [], color=self.colors.get(emotion, (0.5, 0.5, 0.5)),
+                                    linewidth=1.2, label=emotion)[0]
+                      for emotion in emotions]
+        timeline.set_ylim(0, 1.05)
+        timeline.set_ylabel('share', color=foreground)
+        timeline.set_xlabel('seconds ago', color=foreground)
+
+        self.bars = distribution.bar(range(len(emotions)), np.zeros(len(emotions)),
+                                     color=[self.colors.get(e, (0.5, 0.5, 0.5)) for e in emotions])
+        distribution.set_xticks(range(len(emotions)))
+        distribution.set_xticklabels([e[:3] for e in emotions])
+
+        for axes in (timeline, distribution):
+            axes.set_facecolor(background)
+            axes.tick_params(colors=foreground, labelsize=8)
+            for spine in axes.spines.values():
+                spine.set_color(foreground)
+        figure.tight_layout(pad=0.5)
+
+        self.figure = figure
+        self.timeline = timeline
+        self.distribution = distribution
+        self.figure_key = (width, height, dark)
+
+    def render(self, window, size, dark=True):
+        """
+        Draw rolling timelines and the distribution for the last window seconds.
+
+        Returns:
+            numpy.ndarray: (height, width, 4) RGBA image
+        """
+        times, counts = self.series.window(window, time.monotonic())
+        width, height = max(size[0], 100), max(size[1], 100)
+        if self.figure is None or self.figure_key != (width, height, dark):
+            # Layout is computed once per size and theme, not on every render
+            self._build(width, height, dark)
+
+        totals = counts.sum(axis=1)
+        # Share of faces per emotion in each bucket, downsampled to a fixed point budget
+        shares = np.divide(counts, totals[:, None], out=np.zeros(counts.shape), where=totals[:, None] > 0)
+        for column, line in enumerate(self.lines):
+            keep = lttb(times, shares[:, column], self.max_points)
+            line.set_data(times[keep], shares[keep, column])
+        if len(times):
+            self.timeline.set_xlim(times[0], 0)
+
+        window_counts = counts.sum(axis=0)
+        for bar, count in zip(self.bars, window_counts):
+            bar.set_height(count)
+        self.distribution.set_ylim(0, max(1, int(window_counts.max(initial=0))) * 1.1)
+
+        self.figure.canvas.draw()
+        return np.asarray(self.figure.canvas.buffer_rgba()).copy()
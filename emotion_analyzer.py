@@ -1,13 +1,27 @@
-from deepface import DeepFace
 import numpy as np
 import cv2
 import logging
+import queue
+import threading
+import time
 from collections import Counter, deque
+from concurrent.futures import Future
+from resource_config import pin_current_thread
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DeepFace = None
+
+def load_deepface():
+    """Import DeepFace on first use so thin clients never load TensorFlow"""
+    global DeepFace
+    if DeepFace is None:
+        from deepface import DeepFace as _DeepFace
+        DeepFace = _DeepFace
+    return DeepFace
+
 class EmotionAnalyzer:
     def __init__(self):
         self.emotions = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
@@ -34,32 +48,164 @@ class EmotionAnalyzer:
             'default': 0.25    # Default threshold for other emotions
         }
         
+        # Emotion model for batched inference, built on first use
+        self.model = None
+        
+        # Per-thread CLAHE and scratch buffers so preprocessing does not
+        # allocate fresh arrays for every face; CLAHE objects are not thread-safe
+        self.workspace = threading.local()
+        
+    def get_buffer(self, name, shape, dtype=np.uint8):
+        """
+        Get a contiguous per-thread scratch array of the given shape.
+        
+        Storage only grows, so varying face sizes reuse the same memory.
+        The returned array is overwritten by the next call with the same name.
+        """
+        size = int(np.prod(shape))
+        storage = getattr(self.workspace, name, None)
+        if storage is None or storage.size < size or storage.dtype != dtype:
+            storage = np.empty(size, dtype=dtype)
+            setattr(self.workspace, name, storage)
+        return storage[:size].reshape(shape)
+        
+    def get_clahe(self):
+        """CLAHE instance owned by the calling thread"""
+        clahe = getattr(self.workspace, 'clahe', None)
+        if clahe is None:
+            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+            self.workspace.clahe = clahe
+        return clahe
+        
+    def to_gray(self, img):
+        """Gray image, converted the same way as FrameContext.gray"""
+        if img.ndim == 2:
+            return img
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=self.get_buffer('gray', img.shape[:2]))
+        
     def enhance_contrast(self, img):
         """Fast contrast enhancement for real-time processing."""
-        if len(img.shape) == 3:
-            # Convert to LAB color space
-            lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-            l, a, b = cv2.split(lab)
-            
-            # Quick CLAHE
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            cl = clahe.apply(l)
-            
-            # Merge and convert back
-            return cv2.cvtColor(cv2.merge((cl,a,b)), cv2.COLOR_LAB2BGR)
-        return img
+        # The model only sees gray, so CLAHE runs on gray for BGR and gray crops alike
+        gray = self.to_gray(img)
+        return self.get_clahe().apply(gray, dst=self.get_buffer('cl', gray.shape))
 
     def preprocess_face(self, face_img):
-        """Fast face preprocessing for real-time detection."""
+        """
+        Fast face preprocessing for real-time detection.
+        
+        BGR and gray crops of the same face give identical results, so the
+        batched (gray crops) and single-face (BGR crops) paths agree.
+        
+        Returns:
+            numpy.ndarray: Contrast-enhanced gray face, at least 96x96
+        """
+        face_img = self.to_gray(face_img)
+        
         # Quick resize if needed
         if face_img.shape[0] < 96 or face_img.shape[1] < 96:
-            face_img = cv2.resize(face_img, (96, 96))
+            face_img = cv2.resize(face_img, (96, 96), dst=self.get_buffer('resized', (96, 96)))
         
         # Basic contrast enhancement
         face_img = self.enhance_contrast(face_img)
         
         return face_img
 
+    def predict_scores(self, processed_face):
+        """
+        Run the emotion model on a single preprocessed face.
+        
+        Args:
+            processed_face: Face image returned by preprocess_face
+            
+        Returns:
+            dict: Emotion name -> score in percent
+        """
+        if processed_face.ndim == 2:
+            # DeepFace expects BGR; its own gray conversion restores these pixels exactly
+            processed_face = cv2.cvtColor(processed_face, cv2.COLOR_GRAY2BGR)
+        result = load_deepface().analyze(
+            processed_face,
+            actions=['emotion'],
+            enforce_detection=False,
+            detector_backend='opencv',  # Fastest backend
+            silent=True
+        )
+        return result[0]['emotion']
+
+    def predict_scores_batch(self, face_imgs):
+        """
+        Run the emotion model once on a batch of face crops.
+        
+        Unlike predict_scores this skips DeepFace's internal face detection,
+        so inputs should already be tight face crops.
+        
+        Args:
+            face_imgs: List of face images (BGR, or grayscale crops from a
+                FrameContext, which skip the color conversion)
+            
+        Returns:
+            list: Emotion name -> score in percent, one dict per face
+        """
+        if not face_imgs:
+            return []
+        if self.model is None:
+            self.model = load_deepface().build_model('Emotion')
+        
+        # Same input format as DeepFace's emotion model: 48x48 gray in [0, 1]
+        batch = self.get_buffer('batch', (len(face_imgs), 48, 48, 1), np.float32)
+        small = self.get_buffer('small', (48, 48))
+        for i, face_img in enumerate(face_imgs):
+            processed_face = self.preprocess_face(face_img)
+            cv2.resize(processed_face, (48, 48), dst=small)
+            batch[i, :, :, 0] = small
+        batch /= 255.0
+        
+        predictions = self.model.predict(batch, verbose=0)
+        model_emotions = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+        results = []
+        for row in predictions:
+            total = float(row.sum()) or 1.0
+            results.append({emo: 100.0 * float(row[i]) / total for i, emo in enumerate(model_emotions)})
+        return results
+
+    def select_emotion(self, emotions):
+        """
+        Pick the dominant emotion after weighting and confidence thresholds.
+        
+        Args:
+            emotions: Emotion name -> score in percent
+            
+        Returns:
+            tuple: (dominant_emotion, confidence)
+        """
+        # Apply emotion weights
+        weighted_emotions = {
+            emo: emotions[emo] * self.emotion_weights.get(emo, 1.0)
+            for emo in self.emotions
+        }
+        
+        # Get dominant emotion
+        dominant_emotion = max(weighted_emotions.items(), key=lambda x: x[1])
+        confidence = emotions[dominant_emotion[0]] / 100.0
+        
+        # Check confidence threshold
+        threshold = self.confidence_thresholds.get(
+            dominant_emotion[0], 
+            self.confidence_thresholds['default']
+        )
+        
+        if confidence < threshold:
+            # Look for next best emotion that meets threshold
+            sorted_emotions = sorted(weighted_emotions.items(), key=lambda x: x[1], reverse=True)
+            for emotion, _ in sorted_emotions[1:]:
+                conf = emotions[emotion] / 100.0
+                if conf >= self.confidence_thresholds.get(emotion, self.confidence_thresholds['default']):
+                    dominant_emotion = (emotion, weighted_emotions[emotion])
+                    confidence = conf
+                    break
+        
+        return dominant_emotion[0], confidence
+
     def analyze_emotion(self, face_img):
         """
         Fast emotion analysis optimized for real-time performance.
@@ -80,60 +226,41 @@ class EmotionAnalyzer:
             
             # Single fast analysis with opencv backend
             try:
-                result = DeepFace.analyze(
-                    processed_face,
-                    actions=['emotion'],
-                    enforce_detection=False,
-                    detector_backend='opencv',  # Fastest backend
-                    silent=True
-                )
-                emotions = result[0]['emotion']
+                emotions = self.predict_scores(processed_face)
             except Exception as e:
                 logger.debug(f"Analysis failed: {str(e)}")
                 return 'neutral', 0.0
 
-            # Apply emotion weights
-            weighted_emotions = {
-                emo: emotions[emo] * self.emotion_weights.get(emo, 1.0)
-                for emo in self.emotions
-            }
-            
-            # Get dominant emotion
-            dominant_emotion = max(weighted_emotions.items(), key=lambda x: x[1])
-            confidence = emotions[dominant_emotion[0]] / 100.0
-            
-            # Check confidence threshold
-            threshold = self.confidence_thresholds.get(
-                dominant_emotion[0], 
-                self.confidence_thresholds['default']
-            )
-            
-            if confidence < threshold:
-                # Look for next best emotion that meets threshold
-                sorted_emotions = sorted(weighted_emotions.items(), key=lambda x: x[1], reverse=True)
-                for emotion, _ in sorted_emotions[1:]:
-                    conf = emotions[emotion] / 100.0
-                    if conf >= self.confidence_thresholds.get(emotion, self.confidence_thresholds['default']):
-                        dominant_emotion = (emotion, weighted_emotions[emotion])
-                        confidence = conf
-                        break
-            
-            # Update history
-            self.emotion_history.append(dominant_emotion[0])
-            self.confidence_history.append(confidence)
-            
-            # Simple temporal smoothing
-            if len(self.emotion_history) >= 2:
-                # If last two emotions are the same, use that
-                if self.emotion_history[-1] == self.emotion_history[-2]:
-                    return dominant_emotion[0], confidence
-            
-            return dominant_emotion[0], confidence
+            return self.update_emotion(emotions)
             
         except Exception as e:
             logger.error(f"Error in emotion analysis: {str(e)}")
             return 'neutral', 0.1
     
+    def update_emotion(self, emotions):
+        """
+        Select the dominant emotion from raw scores and update the history.
+        
+        Args:
+            emotions: Emotion name -> score in percent
+            
+        Returns:
+            tuple: (dominant_emotion, confidence)
+        """
+        dominant_emotion, confidence = self.select_emotion(emotions)
+        
+        # Update history
+        self.emotion_history.append(dominant_emotion)
+        self.confidence_history.append(confidence)
+        
+        # Simple temporal smoothing
+        if len(self.emotion_history) >= 2:
+            # If last two emotions are the same, use that
+            if self.emotion_history[-1] == self.emotion_history[-2]:
+                return dominant_emotion, confidence
+        
+        return dominant_emotion, confidence
+    
     def get_emotion_color(self, emotion):
         """
         Get color for emotion visualization.
@@ -199,4 +326,170 @@ class EmotionAnalyzer:
             'neutral': f"Neutral ({confidence:.0%} confidence)",
             'unknown': "Unable to determine emotion"
         }
-        return descriptions.get(emotion, "Unable to determine emotion") 
\ No newline at end of file
+        return descriptions.get(emotion, "Unable to determine emotion") 
+
+class InferenceScheduler:
+    """Micro-batching scheduler that runs the emotion model once per batch"""
+    
+    # Latency/throughput presets: (max_batch_size, max_latency in seconds)
+    PRESETS = {
+        'latency': (4, 0.002),
+        'balanced': (8, 0.010),
+        'throughput': (32, 0.030)
+    }
+    
+    def __init__(self, analyzer, max_batch_size=8, max_latency=0.010, max_pending=256):
+        """
+        Create an inference scheduler.
+        
+        Requests from any number of producer threads are queued and grouped
+        into a batch once it is full or the oldest request has waited
+        max_latency seconds.
+        
+        Args:
+            analyzer: EmotionAnalyzer whose predict_scores_batch runs batches
+            max_batch_size: Largest batch passed to the model
+            max_latency: Longest time a request waits for its batch to fill
+            max_pending: Queue bound; requests beyond it fail immediately
+        """
+        self.analyzer = analyzer
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.requests = queue.Queue(maxsize=max_pending)
+        self.thread = None
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+        
+    @classmethod
+    def from_preset(cls, analyzer, preset='balanced'):
+        """Create a scheduler from a named latency/throughput preset"""
+        max_batch_size, max_latency = cls.PRESETS[preset]
+        return cls(analyzer, max_batch_size, max_latency)
+        
+    def start(self):
+        """Start the scheduler thread"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, name='InferenceScheduler', daemon=True)
+        self.thread.start()
+        
+    def stop(self, timeout=5.0):
+        """Finish queued requests and stop the scheduler thread"""
+        if self.thread is not None:
+            self.requests.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+            
+    def submit(self, face_img, flush=False):
+        """
+        Queue a face crop for inference.
+        
+        Args:
+            face_img: Face image (gray or BGR)
+            flush: Dispatch the batch holding this request without waiting
+                for the latency deadline
+            
+        Returns:
+            Future: Resolves to an emotion name -> score in percent dict
+        """
+        future = Future()
+        try:
+            self.requests.put_nowait((face_img, future, time.monotonic(), flush))
+        except queue.Full:
+            with self.stats_lock:
+                self.rejected += 1
+            future.set_exception(RuntimeError("Inference queue is full"))
+        return future
+        
+    def submit_many(self, face_imgs):
+        """
+        Queue a group of face crops, e.g. all faces of one frame.
+        
+        The last crop flushes the batch: a producer that has nothing more to
+        add should not wait out the latency deadline for other producers.
+        
+        Args:
+            face_imgs: Face images (gray or BGR)
+            
+        Returns:
+            list: One Future per face image
+        """
+        last = len(face_imgs) - 1
+        return [self.submit(face_img, flush=i == last) for i, face_img in enumerate(face_imgs)]
+        
+    def reset_stats(self):
+        """Clear batch statistics"""
+        with self.stats_lock:
+            self.batch_sizes = Counter()
+            self.batches = 0
+            self.items = 0
+            self.total_wait = 0.0
+            self.total_inference = 0.0
+            self.rejected = 0
+            
+    def get_stats(self):
+        """
+        Get achieved batching statistics.
+        
+        Returns:
+            dict: Batch count, request count, average batch size, batch size
+            histogram, average queue wait and average model time per batch
+        """
+        with self.stats_lock:
+            batches = self.batches or 1
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'average_batch_size': self.items / batches,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'average_wait': self.total_wait / (self.items or 1),
+                'average_inference': self.total_inference / batches,
+                'pending': self.requests.qsize(),
+                'rejected': self.rejected
+            }
+            
+    def _run(self):
+        """Form batches by size limit or latency deadline and resolve futures"""
+        pin_current_thread('infer')
+        while True:
+            item = self.requests.get()
+            if item is None:
+                return
+            batch = [item]
+            # The deadline is set by the oldest request, not by when we woke up
+            deadline = item[2] + self.max_latency
+            flush = item[3]
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                # After a flush only requests that are already queued join the batch
+                remaining = 0 if flush else deadline - time.monotonic()
+                try:
+                    item = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                flush = flush or item[3]
+                
+            started = time.monotonic()
+            try:
+                results = self.analyzer.predict_scores_batch([face for face, _, _, _ in batch])
+                for (_, future, _, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"Batch inference failed: {str(e)}")
+                for _, future, _, _ in batch:
+                    future.set_exception(e)
+            finished = time.monotonic()
+            
+            with self.stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.batch_sizes[len(batch)] += 1
+                self.total_wait += sum(started - queued for _, _, queued, _ in batch)
+                self.total_inference += finished - started
+                
+            if stopping:
+                return
\ No newline at end of file
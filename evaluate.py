@@ -0,0 +1,316 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+
+# Folder names used by FER-style datasets for our emotion labels
+LABEL_ALIASES = {
+    'anger': 'angry',
+    'disgusted': 'disgust',
+    'fearful': 'fear',
+    'happiness': 'happy',
+    'sadness': 'sad',
+    'surprised': 'surprise',
+    'contempt': None
+}
+
+def find_images(root, emotions, max_per_class=None):
+    """
+    Collect labeled images from a FER-style folder (root/<emotion>/<image>).
+
+    Args:
+        root: Dataset folder, e.g. fer2013/test
+        emotions: Emotion names in model order
+        max_per_class: Optional limit on images per emotion
+
+    Returns:
+        list: (path, label index) pairs
+    """
+    items = []
+    for name in sorted(os.listdir(root)):
+        directory = os.path.join(root, name)
+        if not os.path.isdir(directory):
+            continue
+        emotion = LABEL_ALIASES.get(name.lower(), name.lower())
+        if emotion not in emotions:
+            logger.warning(f"Skipping folder with unknown label: {name}")
+            continue
+        files = sorted(f for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTENSIONS))
+        if max_per_class:
+            files = files[:max_per_class]
+        label = emotions.index(emotion)
+        items.extend((os.path.join(directory, f), label) for f in files)
+    return items
+
+def decode_image(path):
+    """Read an image as grayscale; the batched model only needs gray crops"""
+    return cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+
+def run_model(analyzer, items, batch_size=32, workers=None):
+    """
+    Decode images in parallel and run the analyzer on them in batches.
+
+    Decoding of the next batch overlaps with inference on the current one.
+
+    Args:
+        analyzer: EmotionAnalyzer providing predict_scores_batch
+        items: (path, label index) pairs from find_images
+        batch_size: Faces per model call
+        workers: Decoder threads (defaults to the CPU count)
+
+    Returns:
+        tuple: (scores, labels, timing) where scores is an (N, 7) array of
+        percentages in analyzer.emotions order
+    """
+    workers = workers or os.cpu_count() or 4
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    scores, labels = [], []
+    failed = 0
+    inference_seconds = 0.0
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit(batch):
+            return [executor.submit(decode_image, path) for path, _ in batch]
+
+        pending = submit(batches[0]) if batches else []
+        for index, batch in enumerate(batches):
+            decoded = [future.result() for future in pending]
+            pending = submit(batches[index + 1]) if index + 1 < len(batches) else []
+
+            images, batch_labels = [], []
+            for img, (path, label) in zip(decoded, batch):
+                if img is None or img.size == 0:
+                    logger.warning(f"Cannot decode {path}")
+                    failed += 1
+                    continue
+                images.append(img)
+                batch_labels.append(label)
+            if not images:
+                continue
+
+            t0 = time.perf_counter()
+            results = analyzer.predict_scores_batch(images)
+            inference_seconds += time.perf_counter() - t0
+            scores.extend([result[emotion] for emotion in analyzer.emotions] for result in results)
+            labels.extend(batch_labels)
+
+    elapsed = time.perf_counter() - start
+    timing = {
+        'images': len(labels),
+        'failed': failed,
+        'batch_size': batch_size,
+        'elapsed': elapsed,
+        'inference_seconds': inference_seconds,
+        'images_per_second': len(labels) / elapsed if elapsed > 0 else 0.0,
+        'ms_per_batch': 1000.0 * inference_seconds / len(batches) if batches else 0.0
+    }
+    return np.array(scores, dtype=np.float64).reshape(-1, len(analyzer.emotions)), np.array(labels), timing
+
+def select_emotions(scores, emotions, weights, thresholds):
+    """
+    Vectorized EmotionAnalyzer.select_emotion over many score rows.
+
+    Args:
+        scores: (N, len(emotions)) array of percentages
+        emotions: Emotion names in column order
+        weights: Emotion -> weight
+        thresholds: Emotion -> confidence threshold, with a 'default' entry
+
+    Returns:
+        numpy.ndarray: Predicted emotion index per row
+    """
+    weight = np.array([weights.get(e, 1.0) for e in emotions])
+    threshold = np.array([thresholds.get(e, thresholds['default']) for e in emotions])
+
+    # Candidates in order of weighted score; the first one over its threshold
+    # wins, falling back to the top candidate when none qualifies
+    order = np.argsort(-(scores * weight), axis=1, kind='stable')
+    passes = np.take_along_axis(scores / 100.0 >= threshold, order, axis=1)
+    first = np.argmax(passes, axis=1)
+    first[~passes.any(axis=1)] = 0
+    return order[np.arange(len(order)), first]
+
+def confusion_matrix(labels, predictions, num_classes):
+    """Counts with true labels as rows and predictions as columns"""
+    matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+    np.add.at(matrix, (labels, predictions), 1)
+    return matrix
+
+def classification_report(matrix, emotions):
+    """
+    Per-class precision and recall from a confusion matrix.
+
+    Returns:
+        dict: Accuracy, macro precision/recall and a per-emotion breakdown
+    """
+    true_positives = np.diag(matrix).astype(np.float64)
+    predicted = matrix.sum(axis=0)
+    actual = matrix.sum(axis=1)
+    precision = np.divide(true_positives, predicted, out=np.zeros_like(true_positives), where=predicted > 0)
+    recall = np.divide(true_positives, actual, out=np.zeros_like(true_positives), where=actual > 0)
+    present = actual > 0
+    total = matrix.sum()
+    return {
+        'accuracy': float(true_positives.sum() / total) if total else 0.0,
+        'macro_precision': float(precision[present].mean()) if present.any() else 0.0,
+        'macro_recall': float(recall[present].mean()) if present.any() else 0.0,
+        'classes': {
+            emotion: {'precision': float(precision[i]), 'recall': float(recall[i]), 'support': int(actual[i])}
+            for i, emotion in enumerate(emotions)
+        }
+    }
+
+def parse_grid(specs):
+    """Parse ['happy=1.0,1.2', ...] into {'happy': [1.0, 1.2], ...}"""
+    grid = {}
+    for spec in specs or []:
+        emotion, _, values = spec.partition('=')
+        if not values:
+            raise ValueError(f"Expected EMOTION=V1,V2,... but got {spec!r}")
+        grid[emotion.strip().lower()] = [float(v) for v in values.split(',')]
+    return grid
+
+def sweep(scores, labels, emotions, weights, thresholds, weight_grid, threshold_grid):
+    """
+    Evaluate every combination of weight and threshold overrides.
+
+    Weights and thresholds only affect the selection step, so the stored
+    model scores are reused instead of running the model again.
+
+    Returns:
+        list: One result dict per configuration, best accuracy first
+    """
+    keys = [('weight', e) for e in weight_grid] + [('threshold', e) for e in threshold_grid]
+    values = list(weight_grid.values()) + list(threshold_grid.values())
+    results = []
+    for combination in itertools.product(*values):
+        config_weights, config_thresholds = dict(weights), dict(thresholds)
+        for (kind, emotion), value in zip(keys, combination):
+            (config_weights if kind == 'weight' else config_thresholds)[emotion] = value
+        t0 = time.perf_counter()
+        predictions = select_emotions(scores, emotions, config_weights, config_thresholds)
+        select_ms = 1000.0 * (time.perf_counter() - t0)
+        report = classification_report(confusion_matrix(labels, predictions, len(emotions)), emotions)
+        results.append({
+            'config': {f"{kind}:{emotion}": value for (kind, emotion), value in zip(keys, combination)},
+            'accuracy': report['accuracy'],
+            'macro_recall': report['macro_recall'],
+            'select_ms': select_ms
+        })
+    results.sort(key=lambda r: (r['accuracy'], r['macro_recall']), reverse=True)
+    return results
+
+def pareto_front(points):
+    """
+    Points not beaten on both per-batch latency and throughput.
+
+    Args:
+        points: Dicts with 'ms_per_batch' and 'images_per_second'
+
+    Returns:
+        list: Frontier points, lowest latency first
+    """
+    front = []
+    for point in sorted(points, key=lambda p: (p['ms_per_batch'], -p['images_per_second'])):
+        if not front or point['images_per_second'] > front[-1]['images_per_second']:
+            front.append(point)
+    return front
+
+def format_matrix(matrix, emotions):
+    """Render a confusion matrix as a text table"""
+    width = max(8, max(len(e) for e in emotions) + 1)
+    lines = ['true\\pred'.ljust(width) + ''.join(e[:width - 1].rjust(width) for e in emotions)]
+    for emotion, row in zip(emotions, matrix):
+        lines.append(emotion.ljust(width) + ''.join(str(v).rjust(width) for v in row))
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate MoodSense on a labeled face dataset")
+    parser.add_argument('dataset', help="Folder with one sub-folder of face images per emotion")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--batch-sizes', default='',
+                        help="Comma separated batch sizes to time in addition to --batch-size")
+    parser.add_argument('--workers', type=int, default=None, help="Image decoder threads")
+    parser.add_argument('--max-per-class', type=int, default=None)
+    parser.add_argument('--sweep-weight', action='append', metavar='EMOTION=V1,V2',
+                        help="Emotion weight values to sweep (repeatable)")
+    parser.add_argument('--sweep-threshold', action='append', metavar='EMOTION=V1,V2',
+                        help="Confidence threshold values to sweep; 'default' sets the fallback")
+    parser.add_argument('--output', help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    from emotion_analyzer import EmotionAnalyzer
+
+    analyzer = EmotionAnalyzer()
+    emotions = analyzer.emotions
+    items = find_images(args.dataset, emotions, args.max_per_class)
+    if not items:
+        raise SystemExit(f"No labeled images found in {args.dataset}")
+    print(f"Evaluating {len(items)} images from {args.dataset}")
+
+    scores, labels, timing = run_model(analyzer, items, args.batch_size, args.workers)
+    predictions = select_emotions(scores, emotions, analyzer.emotion_weights, analyzer.confidence_thresholds)
+    matrix = confusion_matrix(labels, predictions, len(emotions))
+    report = classification_report(matrix, emotions)
+
+    print(format_matrix(matrix, emotions))
+    print()
+    print(f"{'emotion':<10}{'precision':>10}{'recall':>10}{'support':>10}")
+    for emotion, stats in report['classes'].items():
+        print(f"{emotion:<10}{stats['precision']:>10.3f}{stats['recall']:>10.3f}{stats['support']:>10}")
+    print(f"\nAccuracy: {report['accuracy']:.3f}  macro recall: {report['macro_recall']:.3f}")
+    print(f"Throughput: {timing['images_per_second']:.1f} img/s "
+          f"({timing['ms_per_batch']:.1f} ms per batch of {args.batch_size})")
+
+    full_report = {'dataset': args.dataset, 'timing': [timing], 'report': report,
+                   'confusion_matrix': matrix.tolist()}
+
+    # Batch size is what trades latency for throughput; time the extra sizes
+    for batch_size in [int(b) for b in args.batch_sizes.split(',') if b.strip()]:
+        if batch_size == args.batch_size:
+            continue
+        _, _, extra = run_model(analyzer, items, batch_size, args.workers)
+        full_report['timing'].append(extra)
+        print(f"Batch size {batch_size}: {extra['images_per_second']:.1f} img/s, "
+              f"{extra['ms_per_batch']:.1f} ms per batch")
+
+    weight_grid = parse_grid(args.sweep_weight)
+    threshold_grid = parse_grid(args.sweep_threshold)
+    if weight_grid or threshold_grid:
+        results = sweep(scores, labels, emotions, analyzer.emotion_weights,
+                        analyzer.confidence_thresholds, weight_grid, threshold_grid)
+        full_report['sweep'] = results
+        print(f"\nSweep over {len(results)} configurations (best first):")
+        for result in results[:10]:
+            config = ' '.join(f"{k}={v:g}" for k, v in result['config'].items())
+            print(f"  acc {result['accuracy']:.3f}  macro recall {result['macro_recall']:.3f}  {config}")
+
+        full_report['best'] = results[0]
+
+    # Weights and thresholds cost nothing at inference time, so accuracy is the
+    # same at every batch size and the frontier is latency against throughput
+    if len(full_report['timing']) > 1:
+        full_report['frontier'] = pareto_front(full_report['timing'])
+        print("\nLatency/throughput frontier:")
+        for point in full_report['frontier']:
+            print(f"  batch {point['batch_size']}: {point['ms_per_batch']:.1f} ms per batch, "
+                  f"{point['images_per_second']:.1f} img/s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(full_report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+if __name__ == '__main__':
+    main()
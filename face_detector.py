@@ -1,5 +1,6 @@
 import cv2
 import numpy as np
+from frame_context import FrameContext
 
 class FaceDetector:
     def __init__(self):
@@ -8,28 +9,42 @@ class FaceDetector:
             cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
         )
         
-    def detect_faces(self, frame):
+    def detect(self, context, level=0):
         """
-        Detect faces in the given frame.
+        Detect faces on the shared grayscale image of a frame context.
         
         Args:
-            frame: Input frame (BGR format)
+            context: FrameContext of the frame
+            level: Pyramid level to run on; 1 halves the resolution, boxes are
+                scaled back to full-frame coordinates
             
         Returns:
             list: List of face locations (x, y, w, h)
-            frame: Frame with face detection visualization
         """
-        # Convert frame to grayscale
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Detect faces
+        scale = 2 ** level
         faces = self.face_cascade.detectMultiScale(
-            gray,
+            context.pyramid(level),
             scaleFactor=1.1,
             minNeighbors=5,
-            minSize=(30, 30),
+            minSize=(max(1, 30 // scale), max(1, 30 // scale)),
             flags=cv2.CASCADE_SCALE_IMAGE
         )
+        if level and len(faces):
+            faces = faces * scale
+        return faces
+        
+    def detect_faces(self, frame):
+        """
+        Detect faces in the given frame.
+        
+        Args:
+            frame: Input frame (BGR format)
+            
+        Returns:
+            list: List of face locations (x, y, w, h)
+            frame: Frame with face detection visualization
+        """
+        faces = self.detect(FrameContext(frame))
         
         # Draw rectangles around faces
         frame_with_faces = frame.copy()
@@ -53,7 +68,8 @@ class FaceDetector:
         face_img = frame[y:y + h, x:x + w]
         return face_img
     
-    def is_valid_face(self, face_img, min_size=30):
+    @staticmethod
+    def is_valid_face(face_img, min_size=30):
         """
         Check if the detected face is valid.
         
@@ -71,4 +87,144 @@ class FaceDetector:
         if height < min_size or width < min_size:
             return False
         
-        return True 
\ No newline at end of file
+        return True
+
+class FaceQualityGate:
+    """Cheap quality scoring that decides whether a face crop is worth analyzing"""
+    def __init__(self, min_size=30, min_sharpness=20.0, min_brightness=40.0,
+                 max_brightness=215.0, min_contrast=15.0, aspect_range=(0.6, 1.6),
+                 min_symmetry=None):
+        """
+        Args:
+            min_size: Minimum face width and height in pixels
+            min_sharpness: Minimum Laplacian variance (measured at 64x64)
+            min_brightness: Minimum mean gray level
+            max_brightness: Maximum mean gray level
+            min_contrast: Minimum gray level standard deviation
+            aspect_range: Allowed (min, max) width/height ratio, which catches
+                faces truncated at the frame border
+            min_symmetry: Optional minimum left/right mirror correlation, a
+                rough filter for extreme profiles (None disables it)
+        """
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_contrast = min_contrast
+        self.aspect_range = aspect_range
+        self.min_symmetry = min_symmetry
+        self.passed = 0
+        self.rejected = 0
+        
+    def evaluate(self, face_img):
+        """
+        Score a face crop and decide whether to pass it to the model.
+        
+        Args:
+            face_img: Face image, preferably a grayscale crop such as
+                FrameContext.gray_crop (BGR crops are converted)
+            
+        Returns:
+            tuple: (passed, reason, metrics) where reason names the first
+            failed check (None when passed)
+        """
+        metrics = {}
+        reason = self._check(face_img, metrics)
+        if reason is None:
+            self.passed += 1
+        else:
+            self.rejected += 1
+        return reason is None, reason, metrics
+        
+    def _check(self, face_img, metrics):
+        if not FaceDetector.is_valid_face(face_img, self.min_size):
+            return 'size'
+            
+        height, width = face_img.shape[:2]
+        metrics['aspect'] = width / float(height)
+        if not self.aspect_range[0] <= metrics['aspect'] <= self.aspect_range[1]:
+            return 'aspect'
+            
+        # Measure on a fixed-size thumbnail so thresholds do not depend on face size
+        gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY) if face_img.ndim == 3 else face_img
+        small = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA)
+        
+        mean, std = cv2.meanStdDev(small)
+        metrics['brightness'] = float(mean[0][0])
+        metrics['contrast'] = float(std[0][0])
+        if not self.min_brightness <= metrics['brightness'] <= self.max_brightness:
+            return 'exposure'
+        if metrics['contrast'] < self.min_contrast:
+            return 'contrast'
+            
+        metrics['sharpness'] = float(cv2.Laplacian(small, cv2.CV_64F).var())
+        if metrics['sharpness'] < self.min_sharpness:
+            return 'blur'
+            
+        if self.min_symmetry is not None:
+            left = small[:, :32].astype(np.float32)
+            right = cv2.flip(small[:, 32:], 1).astype(np.float32)
+            metrics['symmetry'] = float(cv2.matchTemplate(left, right, cv2.TM_CCOEFF_NORMED)[0][0])
+            if metrics['symmetry'] < self.min_symmetry:
+                return 'profile'
+                
+        return None
+
+class FaceTracker:
+    """Assign stable ids to detected faces across frames"""
+    def __init__(self, max_distance=0.6, max_missing=10):
+        """
+        Args:
+            max_distance: Maximum centroid shift, relative to face size, for a match
+            max_missing: Frames a face may go undetected before its id is dropped
+        """
+        self.max_distance = max_distance
+        self.max_missing = max_missing
+        self.tracks = {}  # id -> [center_x, center_y, size, missed_frames]
+        self.next_id = 0
+        
+    def update(self, faces):
+        """
+        Match detections to existing tracks by nearest centroid.
+        
+        Args:
+            faces: List of face locations (x, y, w, h)
+            
+        Returns:
+            list: Track id for each face, in the same order
+        """
+        detections = [(x + w / 2.0, y + h / 2.0, float(max(w, h))) for (x, y, w, h) in faces]
+        
+        # Greedy assignment, closest pairs first
+        candidates = []
+        for tid, (tx, ty, tsize, _) in self.tracks.items():
+            for i, (cx, cy, size) in enumerate(detections):
+                distance = np.hypot(cx - tx, cy - ty) / max(tsize, size)
+                if distance <= self.max_distance:
+                    candidates.append((distance, tid, i))
+        candidates.sort()
+        
+        ids = [None] * len(detections)
+        matched = set()
+        for _, tid, i in candidates:
+            if tid in matched or ids[i] is not None:
+                continue
+            ids[i] = tid
+            matched.add(tid)
+            self.tracks[tid] = [detections[i][0], detections[i][1], detections[i][2], 0]
+            
+        # Age out tracks that were not seen in this frame
+        for tid in list(self.tracks):
+            if tid not in matched:
+                self.tracks[tid][3] += 1
+                if self.tracks[tid][3] > self.max_missing:
+                    del self.tracks[tid]
+                    
+        # Start new tracks for unmatched faces
+        for i, detection in enumerate(detections):
+            if ids[i] is None:
+                ids[i] = self.next_id
+                self.tracks[self.next_id] = [detection[0], detection[1], detection[2], 0]
+                self.next_id += 1
+                
+        return ids 
\ No newline at end of file
@@ -0,0 +1,75 @@
+import cv2
+
+class FrameContext:
+    """
+    One captured frame plus lazily computed, memoized derived views.
+
+    Created once per frame and passed to the detector, analyzer and renderer
+    so each color conversion happens at most once per frame. Crops are
+    zero-copy slices of the frame or of the shared grayscale image.
+    """
+
+    def __init__(self, frame, timestamp=None):
+        """
+        Args:
+            frame: Frame (BGR format); the context does not copy it
+            timestamp: Capture time in seconds
+        """
+        self.frame = frame
+        self.timestamp = timestamp
+        self._cache = {}
+
+    @property
+    def shape(self):
+        return self.frame.shape
+
+    @property
+    def gray(self):
+        """Grayscale frame"""
+        gray = self._cache.get('gray')
+        if gray is None:
+            gray = self.frame if self.frame.ndim == 2 else cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+            self._cache['gray'] = gray
+        return gray
+
+    @property
+    def rgb(self):
+        """RGB frame for display"""
+        rgb = self._cache.get('rgb')
+        if rgb is None:
+            rgb = cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB)
+            self._cache['rgb'] = rgb
+        return rgb
+
+    def pyramid(self, level):
+        """
+        Grayscale pyramid level; each level halves the previous one.
+
+        Args:
+            level: 0 for the full-size gray frame
+
+        Returns:
+            numpy.ndarray: Downscaled gray image
+        """
+        levels = self._cache.setdefault('pyramid', [self.gray])
+        while len(levels) <= level:
+            levels.append(cv2.pyrDown(levels[-1]))
+        return levels[level]
+
+    def _slice(self, img, box):
+        x, y, w, h = (int(v) for v in box)
+        height, width = img.shape[:2]
+        x0, y0 = max(0, x), max(0, y)
+        return img[y0:min(height, y + h), x0:min(width, x + w)]
+
+    def crop(self, box):
+        """Zero-copy BGR view of a (x, y, w, h) box, clipped to the frame"""
+        return self._slice(self.frame, box)
+
+    def gray_crop(self, box):
+        """Zero-copy grayscale view of a (x, y, w, h) box, clipped to the frame"""
+        return self._slice(self.gray, box)
+
+    def invalidate(self):
+        """Drop derived views after the frame has been drawn on in place"""
+        self._cache.clear()
@@ -1,29 +1,103 @@
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QPushButton, QLabel, QComboBox, QFrame, QGridLayout, QStatusBar,
-                             QMenuBar, QMenu, QAction, QShortcut, QMessageBox, QDialog)
+                             QMenuBar, QMenu, QAction, QShortcut, QMessageBox, QDialog, QSizePolicy)
 from PyQt5.QtCore import Qt, QTimer, QSize, QSettings
 from PyQt5.QtGui import QImage, QPixmap, QIcon, QFont, QColor, QPalette, QKeySequence
 import cv2
 import sys
 import os
+import time
 from datetime import datetime
 import numpy as np
 from settings import Settings, SettingsDialog
+from camera_capture import CameraCapture
+from frame_context import FrameContext
+from profiler import PipelineProfiler
+from dashboard import EmotionTimeSeries, DashboardRenderer
+from overlay_renderer import OverlayRenderer
+import resource_config
+from capture_writer import CaptureWriter
+from clip_recorder import ClipRecorder, EmotionTransitionTrigger
+from face_detector import FaceTracker, FaceQualityGate
+from motion_detector import MotionDetector
+from mp_pipeline import MultiprocessPipeline
+from inference_server import RemoteEmotionAnalyzer
+from emotion_analyzer import InferenceScheduler
+from utils import EmotionCounter, EmotionLog
 
 class EmotionDetectionGUI(QMainWindow):
     def __init__(self, face_detector, emotion_analyzer):
         super().__init__()
         self.face_detector = face_detector
         self.emotion_analyzer = emotion_analyzer
+        self.local_analyzer = emotion_analyzer
+        self.scheduler = None
+        self.scheduler_config = None
         self.settings = Settings()
         self.settings.settings_changed.connect(self.apply_settings)
         
-        # Initialize camera with settings
+        # Camera is opened by apply_settings; a grab thread keeps the newest frame
         self.camera_index = int(self.settings.get('camera_index', 0))
-        self.cap = cv2.VideoCapture(self.camera_index)
+        self.cap = None
+        self.camera_config = None
+        self.capture_status = QLabel()
+        
+        # Background screenshot writer keeps encoding off the UI thread
+        self.capture_writer = CaptureWriter('screenshots')
+        self.capture_writer.start()
+        self.last_frame = None
+        self.last_source_frame = None
+        
+        # Face tracking and event-triggered clip recording
+        self.face_tracker = FaceTracker()
+        self.detection_level = 0
+        self.quality_gate = None
+        self.last_good_results = {}
+        self.last_detections = []
+        
+        # Optional multiprocess pipeline replaces the in-process capture loop
+        self.mp_pipeline = None
+        self.pipeline_config = None
+        
+        # Motion gating idles detection and inference on static scenes
+        self.motion_detector = None
+        self.motion_status = QLabel()
+        self.clip_recorder = None
+        self.clip_trigger = None
+        self.clip_config = None
+        
+        # Counters live in a NumPy array; widgets are refreshed on a timer
+        self.emotion_counter = EmotionCounter(self.emotion_analyzer.emotions)
+        self.emotion_log = EmotionLog()
+        self.latest_emotion = None
+        
+        # Rolling mood dashboard, rendered off the frame loop at most once a second
+        self.emotion_series = EmotionTimeSeries(self.emotion_analyzer.emotions)
+        colors = {emotion: tuple(c / 255.0 for c in reversed(self.emotion_analyzer.get_emotion_color(emotion)))
+                  for emotion in self.emotion_analyzer.emotions}
+        self.dashboard = DashboardRenderer(self.emotion_series, colors)
+        self.dashboard.start()
+        self.dashboard_image_id = 0
+        
+        # Face annotations are drawn from cached label and emoji sprites
+        styled = list(self.emotion_analyzer.emotions) + ['unknown']
+        self.overlay = OverlayRenderer(
+            {emotion: self.emotion_analyzer.get_emotion_color(emotion) for emotion in styled},
+            {emotion: self.emotion_analyzer.get_emotion_emoji(emotion) for emotion in styled})
+        self.displayed_emotion = None
+        
+        # On-demand profiling of the pipeline threads and process_frame
+        self.profiler = PipelineProfiler('logs')
+        self.profile_duration = 30
+        self.profile_timer = QTimer()
+        self.profile_timer.setSingleShot(True)
+        self.profile_timer.timeout.connect(self.finish_profiling)
+        self.display_dirty = False
         
         # Initialize status bar
         self.statusBar().showMessage("Ready")  # Use the built-in statusBar() method
+        self.statusBar().addPermanentWidget(self.motion_status)
+        self.statusBar().addPermanentWidget(self.capture_status)
         
         self.setup_ui()
         self.setup_menu()
@@ -42,6 +116,10 @@ class EmotionDetectionGUI(QMainWindow):
         settings_action.triggered.connect(self.show_settings)
         file_menu.addAction(settings_action)
         
+        self.profile_action = QAction(f'Profile Pipeline ({self.profile_duration} s)', self)
+        self.profile_action.triggered.connect(self.toggle_profiling)
+        file_menu.addAction(self.profile_action)
+        
         file_menu.addSeparator()
         
         exit_action = QAction('Exit', self)
@@ -94,6 +172,25 @@ class EmotionDetectionGUI(QMainWindow):
         if dialog.exec_() == QDialog.Accepted:
             self.apply_settings()
             
+    def toggle_profiling(self):
+        """Start a timed profiling run, or end the current one early"""
+        if self.profiler.running:
+            self.finish_profiling()
+            return
+        self.profiler.start()
+        self.profile_action.setText('Stop Profiling')
+        self.profile_timer.start(self.profile_duration * 1000)
+        self.statusBar().showMessage(f"Profiling for {self.profile_duration} s...", 3000)
+        
+    def finish_profiling(self):
+        """Stop profiling and report where the files were written"""
+        if not self.profiler.running:
+            return
+        self.profile_timer.stop()
+        files = self.profiler.stop()
+        self.profile_action.setText(f'Profile Pipeline ({self.profile_duration} s)')
+        self.statusBar().showMessage(f"Profile saved: {', '.join(files)}", 5000)
+        
     def show_about(self):
         """Show about dialog"""
         QMessageBox.about(self, "About Emotion Detection",
@@ -200,68 +297,414 @@ class EmotionDetectionGUI(QMainWindow):
                 }
             """)
             
-        # Update camera if needed
-        new_camera_index = int(self.settings.get('camera_index', 0))
-        if new_camera_index != self.camera_index:
-            self.camera_index = new_camera_index
-            self.cap.release()
-            self.cap = cv2.VideoCapture(self.camera_index)
-            
         # Update detection interval
         self.timer.setInterval(int(self.settings.get('detection_interval', 30)))
         
+        # Update screenshot encoding
+        self.capture_writer.set_format(self.settings.get('screenshot_format', 'jpg'),
+                                       int(self.settings.get('screenshot_quality', 90)))
+        
+        # Memory budget: share it between queued screenshots and the clip buffer
+        budget = self.memory_budget_bytes()
+        self.capture_writer.max_backlog_bytes = int(budget * 0.2) if budget else None
+        
+        self.configure_clip_recording()
+        self.configure_inference()
+        
+        # The performance preset detects on the first pyramid level (half resolution)
+        self.detection_level = 1 if self.settings.get('detection_quality', 'balanced') == 'performance' else 0
+        
+        # Quality gating between detection and inference
+        if self.settings.get_bool('quality_gating', True):
+            self.quality_gate = FaceQualityGate(
+                min_size=int(self.settings.get('min_face_size', 30)),
+                min_sharpness=float(self.settings.get('min_sharpness', 20))
+            )
+        else:
+            self.quality_gate = None
+        
+        if self.settings.get_bool('motion_gating'):
+            heartbeat = int(self.settings.get('motion_heartbeat', 1000)) / 1000.0
+            if self.motion_detector is None:
+                self.motion_detector = MotionDetector()
+            self.motion_detector.heartbeat_interval = heartbeat
+        else:
+            self.motion_detector = None
+            self.motion_status.clear()
+        
+        self.configure_pipeline()
+        self.configure_camera()
+        
+    def camera_options(self):
+        """CameraCapture keyword arguments from settings"""
+        return {
+            'width': int(self.settings.get('capture_width', 0)),
+            'height': int(self.settings.get('capture_height', 0)),
+            'fps': int(self.settings.get('capture_fps', 0)),
+            'fourcc': 'MJPG' if self.settings.get_bool('capture_mjpg') else '',
+            'buffer_size': int(self.settings.get('capture_buffer_size', 1))
+        }
+        
+    def configure_camera(self):
+        """(Re)open the camera when its index or capture options change"""
+        if self.mp_pipeline is not None:
+            return
+        camera_index = int(self.settings.get('camera_index', 0))
+        options = self.camera_options()
+        config = (camera_index, str(options))
+        if config == self.camera_config:
+            return
+        self.camera_config = config
+        
+        if self.cap is not None:
+            self.cap.stop()
+        self.camera_index = camera_index
+        self.cap = CameraCapture(camera_index, **options)
+        if not self.cap.start():
+            self.statusBar().showMessage("Error: Cannot open camera - retrying in the background", 3000)
+        
+    def configure_pipeline(self):
+        """Start or stop the multiprocess pipeline to match settings"""
+        mode = self.settings.get('pipeline_mode', 'threaded')
+        gate_options = None
+        if self.quality_gate is not None:
+            gate_options = {'min_size': self.quality_gate.min_size,
+                            'min_sharpness': self.quality_gate.min_sharpness}
+        url = str(self.settings.get('inference_server', '') or '').strip()
+        camera_index = int(self.settings.get('camera_index', 0))
+        capture_options = self.camera_options()
+        config = (mode, camera_index, str(capture_options), str(gate_options), url, self.detection_level)
+        if config == self.pipeline_config:
+            return
+        self.pipeline_config = config
+        
+        if self.mp_pipeline is not None:
+            self.mp_pipeline.stop()
+            self.mp_pipeline = None
+        
+        if mode == 'multiprocess':
+            # The capture process needs exclusive access to the camera
+            if self.cap is not None:
+                self.cap.stop()
+                self.cap = None
+                self.camera_config = None
+            self.camera_index = camera_index
+            # Slots match the requested capture size so frames are copied, not rescaled
+            frame_size = (640, 480)
+            if capture_options['width'] and capture_options['height']:
+                frame_size = (capture_options['width'], capture_options['height'])
+            self.mp_pipeline = MultiprocessPipeline(camera_index, frame_size=frame_size,
+                                                    capture_options=capture_options,
+                                                    gate_options=gate_options, server_url=url,
+                                                    detection_level=self.detection_level,
+                                                    resources=resource_config.ACTIVE)
+            self.mp_pipeline.start()
+            self.statusBar().showMessage("Running capture, detection and inference in separate processes", 3000)
+        
+    def configure_inference(self):
+        """Switch between local inference and a remote inference server"""
+        url = str(self.settings.get('inference_server', '') or '').strip()
+        current_url = getattr(self.emotion_analyzer, 'url', '')
+        if url != current_url:
+            if url:
+                self.emotion_analyzer = RemoteEmotionAnalyzer(url)
+                self.statusBar().showMessage(f"Using inference server: {url}", 3000)
+            else:
+                self.emotion_analyzer = self.local_analyzer
+                self.statusBar().showMessage("Using local inference", 3000)
+        
+        # Micro-batching scheduler for the faces of each frame
+        batching = self.settings.get('inference_batching', 'off')
+        config = (batching, id(self.emotion_analyzer))
+        if config == self.scheduler_config:
+            return
+        self.scheduler_config = config
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler = None
+        if batching in InferenceScheduler.PRESETS:
+            self.scheduler = InferenceScheduler.from_preset(self.emotion_analyzer, batching)
+            self.scheduler.start()
+        
+    def analyze_batched(self, face_imgs):
+        """Run all faces of a frame through the scheduler as one batch"""
+        # This frame is all the UI thread will submit, so the batch is dispatched at once
+        futures = self.scheduler.submit_many(face_imgs)
+        results = []
+        for future in futures:
+            try:
+                results.append(self.emotion_analyzer.update_emotion(future.result(timeout=5.0)))
+            except Exception as e:
+                self.statusBar().showMessage(f"Inference failed: {str(e)}", 3000)
+                results.append(('neutral', 0.0))
+        return results
+        
+    def analyze_faces(self, context, faces, track_ids):
+        """
+        Analyze the faces that pass the quality gate.
+        
+        Rejected faces keep their track's last good result.
+        
+        Args:
+            context: FrameContext of the frame
+            faces: Face locations (x, y, w, h)
+            track_ids: Track id per face
+        
+        Returns:
+            list: (emotion, confidence, fresh) per face, or None for a
+            rejected face that has no earlier result
+        """
+        # The gate and the batched model only need gray crops of the shared gray frame
+        accepted = [i for i, face in enumerate(faces)
+                    if self.quality_gate is None or self.quality_gate.evaluate(context.gray_crop(face))[0]]
+        
+        # With batching enabled, all accepted faces go to the model together
+        if self.scheduler is not None and accepted:
+            analyzed = self.analyze_batched([context.gray_crop(faces[i]) for i in accepted])
+        else:
+            analyzed = [self.emotion_analyzer.analyze_emotion(context.crop(faces[i])) for i in accepted]
+        
+        raw_results = [None] * len(faces)
+        for i, result in zip(accepted, analyzed):
+            raw_results[i] = result
+        return self.merge_last_good(track_ids, raw_results)
+        
+    def merge_last_good(self, track_ids, raw_results):
+        """
+        Fill in rejected faces with their track's last good result.
+        
+        Args:
+            track_ids: Track id per face
+            raw_results: (emotion, confidence) per face, or None if rejected
+            
+        Returns:
+            list: (emotion, confidence, fresh) per face, or None
+        """
+        results = [None] * len(track_ids)
+        for i, (track_id, result) in enumerate(zip(track_ids, raw_results)):
+            if result is not None:
+                self.last_good_results[track_id] = tuple(result)
+                results[i] = tuple(result) + (True,)
+            elif track_id in self.last_good_results:
+                results[i] = self.last_good_results[track_id] + (False,)
+        
+        # Drop results of faces the tracker has forgotten
+        for track_id in list(self.last_good_results):
+            if track_id not in self.face_tracker.tracks:
+                del self.last_good_results[track_id]
+        return results
+        
+    def configure_clip_recording(self):
+        """Create, rebuild or remove the clip recorder to match settings"""
+        enabled = self.settings.get_bool('clip_recording')
+        emotions = tuple(e.strip().lower() for e in
+                         str(self.settings.get('clip_trigger_emotions', 'angry')).split(',') if e.strip())
+        pre_roll = float(self.settings.get('clip_pre_roll', 3))
+        post_roll = float(self.settings.get('clip_post_roll', 3))
+        budget = self.memory_budget_bytes()
+        config = (enabled, emotions, pre_roll, post_roll, budget)
+        if config == self.clip_config:
+            return
+        self.clip_config = config
+        
+        if self.clip_recorder is not None:
+            self.clip_recorder.stop()
+            self.clip_recorder = None
+            self.clip_trigger = None
+        
+        if enabled:
+            self.clip_recorder = ClipRecorder('clips', pre_roll=pre_roll, post_roll=post_roll,
+                                              max_bytes=int(budget * 0.6) if budget else None)
+            self.clip_recorder.start()
+            self.clip_trigger = EmotionTransitionTrigger(emotions)
+        
+    def memory_budget_bytes(self):
+        """Configured memory budget in bytes, or 0 when unlimited"""
+        return int(self.settings.get('memory_budget_mb', 0)) * 1024 * 1024
+        
     def setup_timer(self):
         """Setup timer for video processing"""
         self.timer = QTimer()
-        self.timer.timeout.connect(self.process_frame)
+        self.timer.timeout.connect(lambda: self.profiler.profile_call(self.process_frame))
         self.timer.setInterval(int(self.settings.get('detection_interval', 30)))
         
+        # Side panel refresh is throttled instead of running per face
+        self.display_timer = QTimer()
+        self.display_timer.timeout.connect(self.refresh_display)
+        self.display_timer.setInterval(250)
+        self.display_timer.start()
+        
+    def refresh_display(self):
+        """Push the latest emotion and counters to the side panel widgets"""
+        if self.motion_detector is not None:
+            self.motion_status.setText(f"Idle: {self.motion_detector.skipped_fraction():.0%} of frames skipped")
+        self.refresh_dashboard()
+        if self.cap is not None and self.timer.isActive():
+            stats = self.cap.get_stats()
+            self.capture_status.setText(
+                f"Camera: {stats['fps']:.0f} fps, {stats['average_latency_ms']:.0f} ms, {stats['dropped']} dropped")
+        else:
+            self.capture_status.clear()
+        if not self.display_dirty:
+            return
+        self.display_dirty = False
+        for emotion, count in self.emotion_counter.counts().items():
+            if emotion in self.stats_labels:
+                self.stats_labels[emotion].setText(str(count))
+        if self.latest_emotion is not None:
+            self.update_emotion_display(*self.latest_emotion)
+        
+    def refresh_dashboard(self, force=False):
+        """Request a dashboard render and show the newest finished one"""
+        if force or self.timer.isActive():
+            size = self.dashboard_label.size()
+            self.dashboard.request_render(int(self.settings.get('dashboard_window', 300)),
+                                          (size.width(), size.height()),
+                                          self.settings.get('theme', 'dark') == 'dark')
+        image_id, image = self.dashboard.latest()
+        if image_id != self.dashboard_image_id:
+            self.dashboard_image_id = image_id
+            h, w = image.shape[:2]
+            qt_image = QImage(image.data, w, h, 4 * w, QImage.Format_RGBA8888)
+            self.dashboard_label.setPixmap(QPixmap.fromImage(qt_image))
+        
+    def set_dashboard_window(self, index):
+        """Store the dashboard window picked in the panel"""
+        self.settings.set('dashboard_window', self.dashboard_window_combo.itemData(index))
+        self.refresh_dashboard(force=True)
+        
+    def detect_and_analyze(self, context):
+        """
+        Detect faces, analyze their emotions and record the results.
+        
+        Args:
+            context: FrameContext of the current frame
+        
+        Returns:
+            list: (track_id, (x, y, w, h), result) per face, where result is
+            (emotion, confidence, fresh) or None
+        """
+        faces = self.face_detector.detect(context, self.detection_level)
+        track_ids = self.face_tracker.update(faces)
+        
+        # Analyze the face regions good enough for the model
+        results = self.analyze_faces(context, faces, track_ids)
+        self.record_results(track_ids, results, context.timestamp)
+        
+        return [(track_id, tuple(int(v) for v in face), result)
+                for track_id, face, result in zip(track_ids, faces, results)]
+        
+    def record_results(self, track_ids, results, now):
+        """Count, log and check clip triggers for freshly analyzed faces"""
+        for track_id, result in zip(track_ids, results):
+            if result is None or not result[2]:
+                continue
+            emotion, confidence, _ = result
+            
+            # Record for the throttled display refresh and the log
+            self.latest_emotion = (emotion, confidence)
+            self.emotion_counter.increment(emotion)
+            self.emotion_series.record(emotion, now)
+            self.emotion_log.log(emotion, confidence)
+            self.display_dirty = True
+            
+            # Record a clip when this face switches into a trigger emotion
+            if self.clip_trigger is not None:
+                transition = self.clip_trigger.update(track_id, emotion, now)
+                if transition is not None:
+                    clip_file = self.clip_recorder.trigger(emotion, now)
+                    if clip_file:
+                        self.statusBar().showMessage(f"Recording clip: {clip_file}", 3000)
+        
     def process_frame(self):
         """Process video frame with enhanced visualization"""
-        ret, frame = self.cap.read()
-        if not ret:
-            self.statusBar().showMessage("Error: Cannot read from camera", 3000)
+        if self.mp_pipeline is not None:
+            self.process_pipeline_results()
+            return
+            
+        # Newest grabbed frame; stale driver-buffered frames are never shown. Never
+        # wait on the GUI thread: without a new frame this tick is simply skipped.
+        frame, now = self.cap.latest(timeout=0)
+        if frame is None:
+            if not self.cap.connected:
+                self.statusBar().showMessage("Error: Cannot read from camera - reconnecting", 3000)
             return
             
         # Flip frame horizontally for mirror effect
         frame = cv2.flip(frame, 1)
         
-        # Show FPS if enabled
-        if self.settings.get('show_fps') == 'true':
-            fps = self.cap.get(cv2.CAP_PROP_FPS)
-            cv2.putText(frame, f"FPS: {fps:.1f}", (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        # Feed the clip pre-roll buffer with the clean frame
+        if self.clip_recorder is not None:
+            self.clip_recorder.add_frame(frame, now)
         
-        # Detect faces and emotions
-        faces, _ = self.face_detector.detect_faces(frame)
+        # Cheap motion check decides whether this frame gets full processing
+        process_scene = self.motion_detector is None or self.motion_detector.update(frame, now)
         
-        for (x, y, w, h) in faces:
-            # Extract face region
-            face_img = frame[y:y+h, x:x+w]
-            
-            # Analyze emotion
-            emotion, confidence = self.emotion_analyzer.analyze_emotion(face_img)
-            
-            # Update emotion display
-            self.update_emotion_display(emotion, confidence)
+        # Detect faces and emotions, or reuse the last results on a static scene
+        context = FrameContext(frame, now)
+        if process_scene:
+            self.last_detections = self.detect_and_analyze(context)
+        
+        self.render_frame(context)
+        
+    def process_pipeline_results(self):
+        """Record and display frames finished by the multiprocess pipeline"""
+        items = self.mp_pipeline.poll()
+        if self.mp_pipeline.failed:
+            self.statusBar().showMessage(
+                f"Pipeline {self.mp_pipeline.failed} stage failed; switching to threaded mode", 5000)
+            self.settings.set('pipeline_mode', 'threaded')
+            return
+        if not items:
+            if self.mp_pipeline.ended and self.statusBar().currentMessage() != "Video source ended":
+                self.statusBar().showMessage("Video source ended")
+            return
             
-            # Update statistics
-            self.stats_labels[emotion].setText(str(int(self.stats_labels[emotion].text()) + 1))
+        frame = None
+        for index, (slot, frame_id, timestamp, faces, raw_results) in enumerate(items):
+            frame_view = self.mp_pipeline.frame(slot)
+            if self.clip_recorder is not None:
+                self.clip_recorder.add_frame(frame_view, timestamp)
+                
+            track_ids = self.face_tracker.update(faces)
+            results = self.merge_last_good(track_ids, raw_results)
+            self.record_results(track_ids, results, timestamp)
+            self.last_detections = list(zip(track_ids, faces, results))
             
-            # Draw face rectangle with emotion color
-            color = self.emotion_analyzer.get_emotion_color(emotion)
-            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+            # Only the newest frame is drawn; copy it out before freeing the slot
+            if index == len(items) - 1:
+                frame = frame_view.copy()
+            self.mp_pipeline.release(slot)
             
-            # Add emotion text above face
-            text = f"{emotion.upper()} ({confidence:.0%})"
-            cv2.putText(frame, text, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+        self.render_frame(FrameContext(frame, timestamp))
+        
+    def render_frame(self, context):
+        """Draw the current detections on a frame and show it"""
+        frame = context.frame
+        # Full-resolution screenshots save the clean source frame, so keep it before drawing
+        self.last_source_frame = frame.copy() if self.settings.get_bool('screenshot_full_resolution') else None
+        for track_id, box, result in self.last_detections:
+            if result is None:
+                # No usable crop of this face yet
+                self.overlay.draw_unknown(frame, box)
+                continue
+            emotion, confidence, _ = result
+            self.overlay.draw(frame, box, emotion, confidence)
+        
+        # Show FPS if enabled (drawn last so it never reaches the detector)
+        if self.settings.get('show_fps') == 'true' and self.cap is not None:
+            cv2.putText(frame, f"FPS: {self.cap.measured_fps:.1f}", (10, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        
+        if self.clip_trigger is not None:
+            self.clip_trigger.prune(context.timestamp)
             
-            # Add emoji next to face
-            emoji = self.emotion_analyzer.get_emotion_emoji(emotion)
-            cv2.putText(frame, emoji, (x+w+10, y+30), cv2.FONT_HERSHEY_SIMPLEX, 1.5, color, 2)
+        # Keep the annotated frame for display-size screenshots
+        self.last_frame = frame
         
-        # Convert frame to QImage and display
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # Annotations changed the frame, so derived views are recomputed once here
+        context.invalidate()
+        rgb_frame = context.rgb
         h, w, ch = rgb_frame.shape
         bytes_per_line = ch * w
         qt_image = QImage(rgb_frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
@@ -282,7 +725,18 @@ class EmotionDetectionGUI(QMainWindow):
                                    QMessageBox.No)
         
         if reply == QMessageBox.Yes:
-            self.cap.release()
+            if self.cap is not None:
+                self.cap.stop()
+            self.capture_writer.stop()
+            if self.clip_recorder is not None:
+                self.clip_recorder.stop()
+            if self.scheduler is not None:
+                self.scheduler.stop()
+            if self.mp_pipeline is not None:
+                self.mp_pipeline.stop()
+            self.profiler.stop()
+            self.dashboard.stop()
+            self.emotion_log.flush()
             self.statusBar().showMessage("Application closing...", 1000)
             event.accept()
         else:
@@ -388,6 +842,29 @@ class EmotionDetectionGUI(QMainWindow):
             self.stats_labels[emotion] = count_label
         
         right_layout.addWidget(stats_frame)
+        
+        # Rolling mood dashboard
+        dashboard_frame = QFrame()
+        dashboard_frame.setObjectName("dashboardFrame")
+        dashboard_layout = QVBoxLayout(dashboard_frame)
+        
+        self.dashboard_window_combo = QComboBox()
+        for label, seconds in (('Last minute', 60), ('Last 5 minutes', 300),
+                               ('Last 15 minutes', 900), ('Last hour', 3600)):
+            self.dashboard_window_combo.addItem(label, seconds)
+        index = self.dashboard_window_combo.findData(int(self.settings.get('dashboard_window', 300)))
+        self.dashboard_window_combo.setCurrentIndex(max(0, index))
+        self.dashboard_window_combo.currentIndexChanged.connect(self.set_dashboard_window)
+        dashboard_layout.addWidget(self.dashboard_window_combo)
+        
+        self.dashboard_label = QLabel()
+        self.dashboard_label.setAlignment(Qt.AlignCenter)
+        self.dashboard_label.setMinimumHeight(240)
+        # Renders match the label size, so the pixmap must not resize the label
+        self.dashboard_label.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+        dashboard_layout.addWidget(self.dashboard_label)
+        
+        right_layout.addWidget(dashboard_frame)
         right_layout.addStretch()
         
         # Add panels to main layout
@@ -399,15 +876,18 @@ class EmotionDetectionGUI(QMainWindow):
         
     def update_emotion_display(self, emotion, confidence):
         """Update the emotion display with modern styling"""
-        # Update emoji
-        self.emotion_emoji.setText(self.emotion_analyzer.get_emotion_emoji(emotion))
+        # The description carries the confidence, so it is compared on its own
+        description = self.emotion_analyzer.get_emotion_description(emotion, confidence)
+        if description != self.emotion_description.text():
+            self.emotion_description.setText(description)
         
-        # Update emotion text with confidence
+        # Emoji, label and stylesheet only change with the emotion; restyling is costly
+        if emotion == self.displayed_emotion:
+            return
+        self.displayed_emotion = emotion
+        self.emotion_emoji.setText(self.emotion_analyzer.get_emotion_emoji(emotion))
         self.emotion_label.setText(f"{emotion.upper()}")
         
-        # Update description with confidence
-        self.emotion_description.setText(self.emotion_analyzer.get_emotion_description(emotion, confidence))
-        
         # Update color based on emotion
         color = self.emotion_analyzer.get_emotion_color(emotion)
         self.emotion_label.setStyleSheet(f"""
@@ -431,21 +911,21 @@ class EmotionDetectionGUI(QMainWindow):
             self.statusBar().showMessage("Detection started - Analyzing emotions...", 3000)
             
     def capture_screenshot(self):
-        """Capture and save screenshot with timestamp and status message"""
-        if not self.video_label.pixmap():
+        """Queue a screenshot for background saving with a status message"""
+        if self.last_frame is None or not self.video_label.pixmap():
             self.statusBar().showMessage("Error: No video feed available", 3000)
             return
             
-        # Create screenshots directory if it doesn't exist
-        if not os.path.exists('screenshots'):
-            os.makedirs('screenshots')
-            
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"screenshots/emotion_{timestamp}.png"
-        
-        # Save screenshot
-        self.video_label.pixmap().save(filename)
+        # Save either the clean source frame or the annotated view at the size shown on screen
+        frame, size = self.last_source_frame, None
+        if frame is None:
+            pixmap = self.video_label.pixmap()
+            frame, size = self.last_frame, (pixmap.width(), pixmap.height())
+        
+        filename = self.capture_writer.submit(frame, prefix='emotion', size=size)
+        if filename is None:
+            self.statusBar().showMessage("Screenshot dropped: writer is busy", 3000)
+            return
         
         # Show success message with filename
-        self.statusBar().showMessage(f"Screenshot saved: {filename}", 3000) 
\ No newline at end of file
+        self.statusBar().showMessage(f"Screenshot queued: {filename}", 3000) 
\ No newline at end of file
@@ -0,0 +1,244 @@
+import argparse
+import logging
+import signal
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from face_detector import FaceDetector, FaceTracker, FaceQualityGate
+from frame_context import FrameContext
+from motion_detector import MotionDetector
+from profiler import PipelineProfiler
+from resource_config import ResourceConfig
+from utils import EmotionCounter, EmotionLog, create_directories, get_rss_mb
+
+logger = logging.getLogger(__name__)
+
+class HeadlessPipeline:
+    """Run face detection and emotion analysis on a video source without the GUI"""
+
+    def __init__(self, face_detector, emotion_analyzer, source, loop=False, emotion_log=None,
+                 quality_gate=None, motion_detector=None, profiler=None):
+        """
+        Create a headless pipeline.
+
+        Args:
+            face_detector: FaceDetector instance
+            emotion_analyzer: EmotionAnalyzer instance
+            source: Camera index or video file path
+            loop: Rewind video files when they end
+            emotion_log: Optional EmotionLog receiving every result
+            quality_gate: Optional FaceQualityGate; rejected faces keep their
+                last good result
+            motion_detector: Optional MotionDetector; static frames reuse the
+                last results
+            profiler: Optional PipelineProfiler; process_frame calls are
+                recorded with cProfile while it runs
+        """
+        self.face_detector = face_detector
+        self.emotion_analyzer = emotion_analyzer
+        self.source = source
+        self.loop = loop
+        self.emotion_log = emotion_log
+        self.quality_gate = quality_gate
+        self.last_good_results = {}
+        self.motion_detector = motion_detector
+        self.last_results = []
+        self.profiler = profiler
+        self.tracker = FaceTracker()
+        self.counter = EmotionCounter(emotion_analyzer.emotions)
+        self.frames = 0
+        self.faces = 0
+        self.cap = None
+
+    def open(self):
+        """Open the video source"""
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            raise IOError(f"Cannot open video source: {self.source}")
+
+    def close(self):
+        """Release the video source and flush the log"""
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        if self.emotion_log is not None:
+            self.emotion_log.flush()
+
+    def read(self):
+        """Read the next frame, rewinding at the end when looping"""
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def process_frame(self, frame):
+        """
+        Detect faces and analyze their emotions.
+
+        Returns:
+            list: (track_id, (x, y, w, h), emotion, confidence) per face
+        """
+        if self.motion_detector is not None and not self.motion_detector.update(frame, time.monotonic()):
+            self.frames += 1
+            return self.last_results
+        
+        context = FrameContext(frame)
+        faces = self.face_detector.detect(context)
+        track_ids = self.tracker.update(faces)
+        results = []
+        for track_id, (x, y, w, h) in zip(track_ids, faces):
+            box = (x, y, w, h)
+            if self.quality_gate is not None and not self.quality_gate.evaluate(context.gray_crop(box))[0]:
+                if track_id in self.last_good_results:
+                    results.append((track_id, (x, y, w, h)) + self.last_good_results[track_id])
+                continue
+            emotion, confidence = self.emotion_analyzer.analyze_emotion(context.crop(box))
+            self.last_good_results[track_id] = (emotion, confidence)
+            self.counter.increment(emotion)
+            if self.emotion_log is not None:
+                self.emotion_log.log(emotion, confidence)
+            results.append((track_id, (x, y, w, h), emotion, confidence))
+        for track_id in list(self.last_good_results):
+            if track_id not in self.tracker.tracks:
+                del self.last_good_results[track_id]
+        self.frames += 1
+        self.faces += len(results)
+        self.last_results = results
+        return results
+
+    def run(self, duration=None, max_frames=None, on_frame=None):
+        """
+        Process frames until the source ends, time runs out or max_frames is hit.
+
+        Args:
+            duration: Optional run time in seconds
+            max_frames: Optional frame limit
+            on_frame: Optional callback(pipeline, results) after every frame
+        """
+        start = time.monotonic()
+        while True:
+            if duration is not None and time.monotonic() - start >= duration:
+                break
+            if max_frames is not None and self.frames >= max_frames:
+                break
+            frame = self.read()
+            if frame is None:
+                break
+            if self.profiler is not None:
+                results = self.profiler.profile_call(self.process_frame, frame)
+            else:
+                results = self.process_frame(frame)
+            if on_frame is not None:
+                on_frame(self, results)
+
+def soak(pipeline, duration, warmup=60.0, sample_interval=5.0, max_growth_mb=20.0):
+    """
+    Run the pipeline for a long time and check that memory stays flat.
+
+    RSS is sampled every sample_interval seconds. After warmup, the median of
+    the first and last few samples must not differ by more than max_growth_mb.
+
+    Returns:
+        dict: Samples, baseline/final RSS, growth, slope and pass/fail
+    """
+    samples = []
+    start = time.monotonic()
+    next_sample = [start]
+
+    def sample(pipeline, results):
+        now = time.monotonic()
+        if now >= next_sample[0]:
+            samples.append((now - start, get_rss_mb()))
+            next_sample[0] = now + sample_interval
+
+    pipeline.run(duration=duration, on_frame=sample)
+    samples.append((time.monotonic() - start, get_rss_mb()))
+
+    steady = np.array([s for s in samples if s[0] >= warmup])
+    if len(steady) < 4:
+        raise ValueError("Soak run too short: need at least 4 samples after warmup")
+
+    window = max(2, len(steady) // 5)
+    baseline = float(np.median(steady[:window, 1]))
+    final = float(np.median(steady[-window:, 1]))
+    slope = float(np.polyfit(steady[:, 0], steady[:, 1], 1)[0]) * 3600.0
+    growth = final - baseline
+    return {
+        'frames': pipeline.frames,
+        'faces': pipeline.faces,
+        'samples': len(samples),
+        'baseline_rss_mb': baseline,
+        'final_rss_mb': final,
+        'growth_mb': growth,
+        'slope_mb_per_hour': slope,
+        'passed': growth <= max_growth_mb
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run MoodSense without the GUI")
+    parser.add_argument('source', help="Camera index or video file")
+    parser.add_argument('--loop', action='store_true', help="Loop video files")
+    parser.add_argument('--duration', type=float, default=None, help="Run time in seconds")
+    parser.add_argument('--no-log', action='store_true', help="Do not write logs/emotion_log.csv")
+    parser.add_argument('--no-quality-gate', action='store_true', help="Analyze every detected face")
+    parser.add_argument('--motion-gating', action='store_true', help="Skip analysis while the scene is static")
+    parser.add_argument('--soak', action='store_true',
+                        help="Loop the source and fail if RSS grows (implies --loop)")
+    parser.add_argument('--warmup', type=float, default=60.0, help="Soak warmup in seconds")
+    parser.add_argument('--sample-interval', type=float, default=5.0, help="Soak RSS sample interval")
+    parser.add_argument('--max-growth-mb', type=float, default=20.0, help="Allowed RSS growth after warmup")
+    parser.add_argument('--profile', action='store_true', help="Profile from the start for --profile-seconds")
+    parser.add_argument('--profile-seconds', type=float, default=30.0,
+                        help="Length of a profiling run; SIGUSR1 also starts or stops one")
+    parser.add_argument('--threads', choices=['off', 'performance', 'balanced', 'quality'],
+                        default='balanced', help="Thread pool preset for TensorFlow and OpenCV")
+    args = parser.parse_args()
+
+    # Thread pools must be sized before the model loads
+    if args.threads != 'off':
+        ResourceConfig.for_quality(args.threads).apply('main')
+
+    from emotion_analyzer import EmotionAnalyzer
+
+    create_directories()
+    source = int(args.source) if args.source.isdigit() else args.source
+    pipeline = HeadlessPipeline(FaceDetector(), EmotionAnalyzer(), source,
+                                loop=args.loop or args.soak,
+                                emotion_log=None if args.no_log else EmotionLog(),
+                                quality_gate=None if args.no_quality_gate else FaceQualityGate(),
+                                motion_detector=MotionDetector() if args.motion_gating else None,
+                                profiler=PipelineProfiler('logs'))
+    
+    # kill -USR1 <pid> toggles profiling; the toggle runs on its own thread so
+    # it can wait for an in-flight process_frame without deadlocking
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(
+            target=pipeline.profiler.toggle, args=(args.profile_seconds,), daemon=True).start())
+    if args.profile:
+        pipeline.profiler.start(args.profile_seconds)
+    
+    pipeline.open()
+    try:
+        if args.soak:
+            report = soak(pipeline, args.duration or 600.0, args.warmup,
+                          args.sample_interval, args.max_growth_mb)
+            for key, value in report.items():
+                print(f"{key}: {value}")
+            sys.exit(0 if report['passed'] else 1)
+        pipeline.run(duration=args.duration)
+        print(f"Processed {pipeline.frames} frames, {pipeline.faces} faces")
+        if pipeline.motion_detector is not None:
+            print(f"Skipped (static scene): {pipeline.motion_detector.skipped_fraction():.1%} of frames")
+        for emotion, count in pipeline.counter.counts().items():
+            print(f"{emotion}: {count}")
+    finally:
+        pipeline.profiler.stop()
+        pipeline.close()
+
+if __name__ == '__main__':
+    main()
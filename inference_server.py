@@ -0,0 +1,324 @@
+import argparse
+import http.client
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+
+from emotion_analyzer import EmotionAnalyzer, InferenceScheduler
+from frame_context import FrameContext
+
+logger = logging.getLogger(__name__)
+
+def decode_part(data, content_type, shape=None):
+    """
+    Decode one encoded image into a BGR image.
+
+    Args:
+        data: Encoded bytes
+        content_type: 'application/octet-stream' for raw pixels, else JPEG/PNG
+        shape: (height, width, channels) of raw pixels
+    """
+    if content_type == 'application/octet-stream':
+        height, width, channels = shape
+        img = np.frombuffer(data, dtype=np.uint8).reshape(
+            (height, width, channels) if channels > 1 else (height, width))
+        return img if channels > 1 else cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Cannot decode image")
+    return img
+
+def decode_image(body, headers):
+    """
+    Decode a request body into a BGR image.
+
+    JPEG/PNG bodies are decoded with OpenCV. Raw bodies
+    (application/octet-stream) need X-Width, X-Height and X-Channels headers.
+    """
+    content_type = headers.get('Content-Type', 'image/jpeg')
+    shape = None
+    if content_type == 'application/octet-stream':
+        shape = (int(headers['X-Height']), int(headers['X-Width']), int(headers.get('X-Channels', 3)))
+    return decode_part(body, content_type, shape)
+
+def decode_images(body, headers):
+    """
+    Decode a multi-image /analyze_batch body into BGR images.
+
+    The body is the encoded images back to back; X-Parts lists their byte
+    lengths. Raw bodies also need X-Shapes with 'HxWxC' per image,
+    separated by ';'.
+    """
+    content_type = headers.get('Content-Type', 'image/jpeg')
+    lengths = [int(n) for n in headers.get('X-Parts', '').split(',') if n]
+    if sum(lengths) != len(body):
+        raise ValueError("X-Parts does not match the body length")
+    shapes = [None] * len(lengths)
+    if content_type == 'application/octet-stream':
+        shapes = [tuple(int(v) for v in shape.split('x')) for shape in headers['X-Shapes'].split(';')]
+        if len(shapes) != len(lengths):
+            raise ValueError("X-Shapes does not match X-Parts")
+    images, offset = [], 0
+    for length, shape in zip(lengths, shapes):
+        images.append(decode_part(body[offset:offset + length], content_type, shape))
+        offset += length
+    return images
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler for /analyze and /analyze_batch (face crops) and /detect (full frames)"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/health':
+            stats = self.server.scheduler.get_stats()
+            stats['status'] = 'ok'
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        try:
+            if self.path == '/analyze_batch':
+                images = decode_images(body, self.headers)
+            else:
+                img = decode_image(body, self.headers)
+        except Exception as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        try:
+            if self.path == '/analyze_batch':
+                # One client's crops form one batch, dispatched without waiting for others
+                futures = self.server.scheduler.submit_many(images)
+                scores = [future.result(self.server.request_timeout) for future in futures]
+                self._send_json(200, {'scores': scores})
+            elif self.path == '/analyze':
+                scores = self.server.scheduler.submit(img).result(self.server.request_timeout)
+                self._send_json(200, {'scores': scores})
+            elif self.path == '/detect':
+                context = FrameContext(img)
+                faces = self.server.face_detector.detect(context)
+                futures = [self.server.scheduler.submit(context.gray_crop(face)) for face in faces]
+                results = [
+                    {'box': [int(x), int(y), int(w), int(h)],
+                     'scores': future.result(self.server.request_timeout)}
+                    for (x, y, w, h), future in zip(faces, futures)
+                ]
+                self._send_json(200, {'faces': results})
+            else:
+                self._send_json(404, {'error': 'not found'})
+        except Exception as e:
+            logger.error(f"Request failed: {str(e)}")
+            self._send_json(500, {'error': str(e)})
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+class InferenceServer(ThreadingHTTPServer):
+    """Local network server hosting FaceDetector + EmotionAnalyzer"""
+    daemon_threads = True
+
+    def __init__(self, address, face_detector, emotion_analyzer,
+                 max_batch_size=16, max_wait=0.01, request_timeout=10.0):
+        super().__init__(address, InferenceRequestHandler)
+        self.face_detector = face_detector
+        self.scheduler = InferenceScheduler(emotion_analyzer, max_batch_size, max_wait)
+        self.request_timeout = request_timeout
+
+    def serve_forever(self, poll_interval=0.5):
+        self.scheduler.start()
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self.scheduler.stop()
+
+class InferenceClient:
+    """Client for InferenceServer; keeps one connection per thread"""
+
+    def __init__(self, url, timeout=5.0, encoding='jpeg', jpeg_quality=90):
+        """
+        Args:
+            url: Server URL, e.g. http://127.0.0.1:8765
+            timeout: Socket timeout in seconds
+            encoding: 'jpeg' to compress crops, 'raw' to send pixels as-is
+            jpeg_quality: JPEG quality when encoding is 'jpeg'
+        """
+        parsed = urlparse(url if '://' in url else f'http://{url}')
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.encoding = encoding
+        self.jpeg_quality = jpeg_quality
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.local.conn = conn
+        return conn
+
+    def _encode(self, img):
+        """Encode an image; returns (bytes, (height, width, channels))"""
+        shape = (img.shape[0], img.shape[1], img.shape[2] if img.ndim == 3 else 1)
+        if self.encoding == 'raw':
+            return np.ascontiguousarray(img).tobytes(), shape
+        ok, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("Cannot encode image")
+        return buffer.tobytes(), shape
+
+    def _content_type(self):
+        return 'application/octet-stream' if self.encoding == 'raw' else 'image/jpeg'
+
+    def _post(self, path, img):
+        body, (height, width, channels) = self._encode(img)
+        headers = {'Content-Type': self._content_type()}
+        if self.encoding == 'raw':
+            headers.update({'X-Width': str(width), 'X-Height': str(height), 'X-Channels': str(channels)})
+        return self._send(path, body, headers)
+
+    def _send(self, path, body, headers):
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request('POST', path, body, headers)
+                response = conn.getresponse()
+                payload = json.loads(response.read())
+                break
+            except (http.client.HTTPException, ConnectionError, OSError):
+                # Stale keep-alive connection: reconnect once
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(payload.get('error', f"HTTP {response.status}"))
+        return payload
+
+    def analyze(self, face_img):
+        """Get emotion scores (percent) for a face crop"""
+        return self._post('/analyze', face_img)['scores']
+
+    def analyze_batch(self, face_imgs):
+        """Get emotion scores (percent) for several face crops in one request"""
+        if not len(face_imgs):
+            return []
+        parts = [self._encode(face_img) for face_img in face_imgs]
+        headers = {
+            'Content-Type': self._content_type(),
+            'X-Parts': ','.join(str(len(data)) for data, _ in parts)
+        }
+        if self.encoding == 'raw':
+            headers['X-Shapes'] = ';'.join('x'.join(str(v) for v in shape) for _, shape in parts)
+        return self._send('/analyze_batch', b''.join(data for data, _ in parts), headers)['scores']
+
+    def detect(self, frame):
+        """Detect faces in a full frame; returns [{'box': [x, y, w, h], 'scores': {...}}]"""
+        return self._post('/detect', frame)['faces']
+
+class RemoteEmotionAnalyzer(EmotionAnalyzer):
+    """EmotionAnalyzer that offloads model inference to an InferenceServer"""
+
+    def __init__(self, url, **client_options):
+        super().__init__()
+        self.url = url
+        self.client = InferenceClient(url, **client_options)
+
+    def preprocess_face(self, face_img):
+        # The server preprocesses crops itself
+        return face_img
+
+    def predict_scores(self, processed_face):
+        return self.client.analyze(processed_face)
+
+    def predict_scores_batch(self, face_imgs):
+        # One round trip for all faces, batched together on the server
+        return self.client.analyze_batch(face_imgs)
+
+def simulate_clients(url, num_clients, requests_per_client, face_size=96):
+    """
+    Hammer a server with concurrent synthetic clients.
+
+    Returns:
+        dict: Request count, errors, elapsed seconds and requests per second
+    """
+    errors = []
+
+    def client_loop(seed):
+        rng = np.random.default_rng(seed)
+        client = InferenceClient(url)
+        for _ in range(requests_per_client):
+            face = rng.integers(0, 256, (face_size, face_size, 3), dtype=np.uint8)
+            try:
+                client.analyze(face)
+            except Exception as e:
+                errors.append(str(e))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(num_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = num_clients * requests_per_client
+    return {
+        'requests': total,
+        'errors': len(errors),
+        'elapsed': elapsed,
+        'requests_per_second': total / elapsed if elapsed > 0 else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="MoodSense local inference server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch-size', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=10.0)
+    parser.add_argument('--simulate-clients', type=int, default=0,
+                        help="Run N simulated clients against an in-process server and exit")
+    parser.add_argument('--requests-per-client', type=int, default=50)
+    args = parser.parse_args()
+
+    from face_detector import FaceDetector
+    server = InferenceServer((args.host, args.port), FaceDetector(), EmotionAnalyzer(),
+                             args.max_batch_size, args.max_wait_ms / 1000.0)
+    url = f"http://{args.host}:{server.server_address[1]}"
+
+    if args.simulate_clients:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        report = simulate_clients(url, args.simulate_clients, args.requests_per_client)
+        report['scheduler'] = server.scheduler.get_stats()
+        server.shutdown()
+        print(json.dumps(report, indent=2))
+        return
+
+    logger.info(f"Inference server listening on {url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,7 @@ from emotion_analyzer import EmotionAnalyzer
 from gui import EmotionDetectionGUI
 from utils import create_directories
 from settings import Settings
+from resource_config import configure_from_settings
 
 def main():
     # Create necessary directories
@@ -14,6 +15,9 @@ def main():
     # Initialize settings
     settings = Settings()
     
+    # Size TensorFlow/OpenCV thread pools before the model loads
+    configure_from_settings(settings)
+    
     # Initialize components
     face_detector = FaceDetector()
     emotion_analyzer = EmotionAnalyzer()
@@ -0,0 +1,92 @@
+import cv2
+import numpy as np
+
+class MotionDetector:
+    """Cheap frame-differencing motion detector used to idle on static scenes"""
+    def __init__(self, size=(64, 48), pixel_threshold=12, min_changed_fraction=0.01,
+                 heartbeat_interval=1.0, hold_time=0.5):
+        """
+        Args:
+            size: (width, height) of the grayscale thumbnail that is compared
+            pixel_threshold: Gray level difference that counts as a changed pixel
+            min_changed_fraction: Fraction of changed pixels that counts as motion
+            heartbeat_interval: Seconds between full runs while the scene is static
+            hold_time: Seconds to keep processing after motion stops
+        """
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.heartbeat_interval = heartbeat_interval
+        self.hold_time = hold_time
+
+        # Preallocated thumbnails: current, previous and the last processed one
+        self.thumb = np.empty((size[1], size[0]), dtype=np.uint8)
+        self.previous = np.empty_like(self.thumb)
+        self.reference = np.empty_like(self.thumb)
+        self.diff = np.empty_like(self.thumb)
+        self.small = None
+        self.initialized = False
+        self.last_motion = float('-inf')
+        self.last_processed = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Clear frame counters"""
+        self.frames = 0
+        self.skipped = 0
+
+    def skipped_fraction(self):
+        """Fraction of frames for which full processing was skipped"""
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def changed_fraction(self, a, b):
+        """Fraction of thumbnail pixels that differ by more than the threshold"""
+        cv2.absdiff(a, b, dst=self.diff)
+        return np.count_nonzero(self.diff > self.pixel_threshold) / float(self.diff.size)
+
+    def update(self, frame, now):
+        """
+        Feed a frame and decide whether it needs full processing.
+
+        Args:
+            frame: Input frame (BGR format)
+            now: Current time in seconds
+
+        Returns:
+            bool: True to run detection and analysis, False to reuse the last results
+        """
+        self.frames += 1
+
+        # Downscale first so the color conversion touches very few pixels
+        if frame.ndim == 3:
+            if self.small is None or self.small.shape[2] != frame.shape[2]:
+                self.small = np.empty((self.size[1], self.size[0], frame.shape[2]), dtype=np.uint8)
+            cv2.resize(frame, self.size, dst=self.small, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.thumb)
+        else:
+            cv2.resize(frame, self.size, dst=self.thumb, interpolation=cv2.INTER_AREA)
+        cv2.GaussianBlur(self.thumb, (3, 3), 0, dst=self.thumb)
+
+        if not self.initialized:
+            self.initialized = True
+            np.copyto(self.previous, self.thumb)
+            np.copyto(self.reference, self.thumb)
+            self.last_processed = now
+            return True
+
+        # Compare with the previous frame for fast motion and with the last
+        # processed frame so slow drift is not missed
+        moving = (self.changed_fraction(self.thumb, self.previous) >= self.min_changed_fraction or
+                  self.changed_fraction(self.thumb, self.reference) >= self.min_changed_fraction)
+        np.copyto(self.previous, self.thumb)
+        if moving:
+            self.last_motion = now
+
+        if (now - self.last_motion <= self.hold_time or
+                now - self.last_processed >= self.heartbeat_interval):
+            np.copyto(self.reference, self.thumb)
+            self.last_processed = now
+            return True
+
+        self.skipped += 1
+        return False
@@ -0,0 +1,458 @@
+import logging
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from camera_capture import CameraCapture
+
+logger = logging.getLogger(__name__)
+
+# Slot ownership: positive = stage processing the slot, negative = queued for it
+FREE, CAPTURE, DETECT, INFER, MAIN = 0, 1, 2, 3, 4
+STAGE_NAMES = {CAPTURE: 'capture', DETECT: 'detect', INFER: 'infer'}
+# The stage whose worker feeds each stage's input queue
+UPSTREAM = {DETECT: CAPTURE, INFER: DETECT}
+
+# Indexes into the shared stats counters
+STAT_CAPTURED, STAT_DROPPED, STAT_DETECTED, STAT_ANALYZED, STAT_READ_ERRORS = range(5)
+
+class SharedFrameRing:
+    """Preallocated frame slots in shared memory, addressed by slot index"""
+
+    def __init__(self, slots, frame_shape, name=None):
+        """
+        Create or attach to a shared frame ring.
+
+        Args:
+            slots: Number of frame slots
+            frame_shape: (height, width, channels) of every slot
+            name: Existing shared memory block to attach to; None creates one
+        """
+        self.slots = slots
+        self.frame_shape = tuple(frame_shape)
+        size = slots * int(np.prod(self.frame_shape))
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            # Spawned workers share the creator's resource tracker, so
+            # attaching does not make them responsible for unlinking
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((slots,) + self.frame_shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        """Detach, and destroy the block if this ring created it"""
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def letterbox_region(source_size, target_size):
+    """
+    Largest centered region of the target with the source's aspect ratio.
+
+    Args:
+        source_size: (height, width) of the incoming frame
+        target_size: (height, width) of the ring slot
+
+    Returns:
+        tuple: (x, y, w, h) of the region inside the target
+    """
+    (source_h, source_w), (target_h, target_w) = source_size, target_size
+    scale = min(target_w / source_w, target_h / source_h)
+    w = max(1, min(target_w, int(round(source_w * scale))))
+    h = max(1, min(target_h, int(round(source_h * scale))))
+    return (target_w - w) // 2, (target_h - h) // 2, w, h
+
+def capture_worker(ring_name, slots, frame_shape, resources, source, capture_options, flip,
+                   free_slots, detect_queue, slot_owner, stats, stop_event):
+    """Copy the newest camera frames into free ring slots"""
+    if resources is not None:
+        resources.apply('capture')
+    ring = SharedFrameRing(slots, frame_shape, ring_name)
+    height, width = frame_shape[:2]
+    cap = CameraCapture(source, **capture_options)
+    cap.start()
+    letterbox_source = None
+    frame_id = 0
+    try:
+        while not stop_event.is_set():
+            frame, timestamp = cap.latest(timeout=0.5)
+            if frame is None:
+                if cap.ended:
+                    break
+                stats[STAT_READ_ERRORS] += 1
+                continue
+            try:
+                slot = free_slots.get_nowait()
+            except queue.Empty:
+                # Downstream is behind: drop rather than queue stale frames
+                stats[STAT_DROPPED] += 1
+                continue
+            slot_owner[slot] = CAPTURE
+            target = ring.frames[slot]
+            if frame.shape[:2] != (height, width):
+                # Scale without distorting faces and pad the rest of the slot black
+                if frame.shape[:2] != letterbox_source:
+                    letterbox_source = frame.shape[:2]
+                    x, y, w, h = letterbox_region(letterbox_source, (height, width))
+                    resized = np.empty((h, w, 3), dtype=np.uint8)
+                frame = cv2.resize(frame, (w, h), dst=resized)
+                target.fill(0)
+                target = target[y:y+h, x:x+w]
+            if flip:
+                cv2.flip(frame, 1, dst=target)
+            else:
+                np.copyto(target, frame)
+            slot_owner[slot] = -DETECT
+            detect_queue.put((slot, frame_id, timestamp))
+            stats[STAT_CAPTURED] += 1
+            frame_id += 1
+    finally:
+        cap.stop()
+        ring.close()
+
+def detect_worker(ring_name, slots, frame_shape, resources, detect_queue, infer_queue,
+                  slot_owner, stats, stop_event, detection_level):
+    """Run the face cascade on frames in the ring"""
+    if resources is not None:
+        resources.apply('detect')
+    from face_detector import FaceDetector
+    from frame_context import FrameContext
+    ring = SharedFrameRing(slots, frame_shape, ring_name)
+    detector = FaceDetector()
+    try:
+        while not stop_event.is_set():
+            try:
+                slot, frame_id, timestamp = detect_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            slot_owner[slot] = DETECT
+            faces = detector.detect(FrameContext(ring.frames[slot]), detection_level)
+            faces = [tuple(int(v) for v in face) for face in faces]
+            slot_owner[slot] = -INFER
+            infer_queue.put((slot, frame_id, timestamp, faces))
+            stats[STAT_DETECTED] += 1
+    finally:
+        ring.close()
+
+def infer_worker(ring_name, slots, frame_shape, resources, infer_queue, result_queue, slot_owner,
+                 stats, stop_event, gate_options, server_url):
+    """Analyze the emotion of every detected face"""
+    if resources is not None:
+        resources.apply('infer')
+    from face_detector import FaceQualityGate
+    ring = SharedFrameRing(slots, frame_shape, ring_name)
+    if server_url:
+        from inference_server import RemoteEmotionAnalyzer
+        analyzer = RemoteEmotionAnalyzer(server_url)
+    else:
+        from emotion_analyzer import EmotionAnalyzer
+        analyzer = EmotionAnalyzer()
+    gate = FaceQualityGate(**gate_options) if gate_options is not None else None
+    try:
+        while not stop_event.is_set():
+            try:
+                slot, frame_id, timestamp, faces = infer_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            slot_owner[slot] = INFER
+            frame = ring.frames[slot]
+            results = []
+            for (x, y, w, h) in faces:
+                face_img = frame[y:y+h, x:x+w]
+                if gate is not None and not gate.evaluate(face_img)[0]:
+                    results.append(None)
+                else:
+                    results.append(analyzer.analyze_emotion(face_img))
+            slot_owner[slot] = -MAIN
+            result_queue.put((slot, frame_id, timestamp, faces, results))
+            stats[STAT_ANALYZED] += 1
+    finally:
+        ring.close()
+
+class MultiprocessPipeline:
+    """Live pipeline with capture, detection and inference in separate processes"""
+
+    def __init__(self, source=0, frame_size=(640, 480), slots=6, flip=True, capture_options=None,
+                 gate_options=None, server_url='', resources=None, detection_level=0, max_restarts=5,
+                 restart_window=60.0, stall_timeout=15.0, startup_timeout=120.0):
+        """
+        Args:
+            source: Camera index or video file for the capture process
+            frame_size: (width, height) of ring slots; frames of another size
+                are scaled to fit and letterboxed to keep their aspect ratio
+            slots: Number of shared frame slots in flight
+            flip: Mirror frames horizontally, like the GUI does
+            capture_options: CameraCapture keyword arguments (resolution, fps, ...)
+            gate_options: FaceQualityGate keyword arguments, or None to disable gating
+            server_url: Optional inference server for the inference process
+            resources: Optional ResourceConfig applied in every worker, with
+                per-stage CPU affinity
+            detection_level: Pyramid level the face detector runs on
+            max_restarts: Crashes of one stage tolerated within restart_window
+            restart_window: Seconds over which crashes are counted
+            stall_timeout: Seconds without analyzed frames, while the camera
+                keeps delivering, after which the pipeline is declared failed
+            startup_timeout: Stall allowance after a detection or inference
+                worker starts, which covers loading the model
+        """
+        self.source = source
+        self.capture_options = capture_options or {}
+        self.frame_shape = (frame_size[1], frame_size[0], 3)
+        self.slots = slots
+        self.flip = flip
+        self.gate_options = gate_options
+        self.server_url = server_url
+        self.resources = resources
+        self.detection_level = detection_level
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.stall_timeout = stall_timeout
+        self.startup_timeout = startup_timeout
+
+        self.ctx = mp.get_context('spawn')  # forking a Qt process is unsafe
+        self.ring = None
+        self.workers = {}
+        self.stop_events = {}
+        self.inputs = {}  # Stage -> queue it reads from; MAIN reads results
+        self.crashes = {stage: [] for stage in STAGE_NAMES}
+        self.restarts = 0
+        self.failed = None
+        self.ended = False
+        self.running = False
+
+    def start(self):
+        """Allocate the ring and launch the worker processes"""
+        self.ring = SharedFrameRing(self.slots, self.frame_shape)
+        self.inputs = {stage: self.ctx.Queue() for stage in (CAPTURE, DETECT, INFER, MAIN)}
+        self.slot_owner = self.ctx.Array('i', self.slots, lock=False)
+        self.stats = self.ctx.Array('q', 5, lock=False)
+        for slot in range(self.slots):
+            self.inputs[CAPTURE].put(slot)
+        for stage in STAGE_NAMES:
+            self._spawn(stage)
+        self.last_poll = time.monotonic()
+        self._reset_watchdog(self.last_poll + self.startup_timeout)
+        self.running = True
+
+    def _spawn(self, stage):
+        stop_event = self.ctx.Event()
+        common = (self.ring.name, self.slots, self.frame_shape, self.resources)
+        if stage == CAPTURE:
+            target, args = capture_worker, common + (
+                self.source, self.capture_options, self.flip, self.inputs[CAPTURE], self.inputs[DETECT],
+                self.slot_owner, self.stats, stop_event)
+        elif stage == DETECT:
+            target, args = detect_worker, common + (
+                self.inputs[DETECT], self.inputs[INFER], self.slot_owner, self.stats, stop_event,
+                self.detection_level)
+        else:
+            target, args = infer_worker, common + (
+                self.inputs[INFER], self.inputs[MAIN], self.slot_owner, self.stats,
+                stop_event, self.gate_options, self.server_url)
+        process = self.ctx.Process(target=target, args=args, name=f"moodsense-{STAGE_NAMES[stage]}",
+                                   daemon=True)
+        process.start()
+        self.workers[stage] = process
+        self.stop_events[stage] = stop_event
+
+    def _stop_worker(self, stage, timeout=3.0):
+        """
+        Ask one worker to exit, terminating it if it does not.
+
+        Returns:
+            bool: True if it exited on its own, leaving its queues usable
+        """
+        process = self.workers.pop(stage)
+        self.stop_events.pop(stage).set()
+        process.join(timeout)
+        if process.is_alive():
+            self._terminate(process)
+            return False
+        return process.exitcode == 0
+
+    @staticmethod
+    def _terminate(process):
+        process.terminate()
+        process.join(1.0)
+        if process.is_alive():
+            process.kill()
+            process.join(1.0)
+
+    def _replace_input(self, stage):
+        """Give a stage a fresh input queue; the old one may be unusable"""
+        old = self.inputs[stage]
+        self.inputs[stage] = self.ctx.Queue()
+        old.cancel_join_thread()
+        old.close()
+
+    def _recover(self, stage):
+        """
+        Replace a dead worker and reclaim the slots it took down with it.
+
+        A worker killed inside queue.get() can die holding the queue's reader
+        lock, so the dead stage gets a fresh input queue. The upstream worker
+        writes to that queue and is restarted with it; if it has to be
+        terminated rather than stopped, its own input queue is replaced too.
+        Slots queued in a replaced queue or held by a restarted worker return
+        to the capture process.
+        """
+        restarted, replaced = [stage], [stage]
+        current = stage
+        while current in UPSTREAM:
+            upstream = UPSTREAM[current]
+            if upstream not in self.workers:
+                break
+            restarted.append(upstream)
+            if self._stop_worker(upstream):
+                break
+            replaced.append(upstream)
+            current = upstream
+
+        for queued_stage in replaced:
+            self._replace_input(queued_stage)
+        for slot in range(self.slots):
+            owner = self.slot_owner[slot]
+            queued_for = CAPTURE if owner == FREE else -owner
+            if owner in restarted or queued_for in replaced:
+                self.release(slot)
+
+        for restarted_stage in reversed(restarted):
+            if restarted_stage == CAPTURE and self.ended:
+                continue
+            self._spawn(restarted_stage)
+        if DETECT in restarted or INFER in restarted:
+            self._reset_watchdog(time.monotonic() + self.startup_timeout)
+
+    def supervise(self):
+        """Restart crashed workers and watch for a pipeline that stopped making progress"""
+        if not self.running:
+            return
+        now = time.monotonic()
+        for stage, process in list(self.workers.items()):
+            if stage not in self.workers or process.is_alive():
+                continue
+            name = STAGE_NAMES[stage]
+            if stage == CAPTURE and process.exitcode == 0:
+                # A video file ran out: a normal end, not a crash
+                logger.info("Pipeline video source ended")
+                del self.workers[stage]
+                self.stop_events.pop(stage)
+                self.ended = True
+                continue
+            logger.warning(f"Pipeline {name} process exited with code {process.exitcode}; restarting")
+
+            crashes = [t for t in self.crashes[stage] if now - t < self.restart_window]
+            crashes.append(now)
+            self.crashes[stage] = crashes
+            if len(crashes) > self.max_restarts:
+                self.failed = name
+                logger.error(f"Pipeline {name} process keeps crashing; giving up")
+                self.stop()
+                return
+
+            del self.workers[stage]
+            self.stop_events.pop(stage)
+            self._recover(stage)
+            self.restarts += 1
+
+        self._check_progress(now)
+
+    def _reset_watchdog(self, deadline):
+        self.progress = (self.stats[STAT_ANALYZED], self.stats[STAT_DETECTED],
+                         self.stats[STAT_CAPTURED] + self.stats[STAT_DROPPED])
+        self.progress_deadline = deadline
+
+    def _check_progress(self, now):
+        """Fail the pipeline when frames keep arriving but none are analyzed"""
+        analyzed, detected, _ = self.progress
+        if self.stats[STAT_ANALYZED] != analyzed:
+            self._reset_watchdog(now + self.stall_timeout)
+            return
+        arrived = self.stats[STAT_CAPTURED] + self.stats[STAT_DROPPED]
+        if now < self.progress_deadline or arrived == self.progress[2]:
+            return
+        self.failed = 'detect' if self.stats[STAT_DETECTED] == detected else 'infer'
+        logger.error(f"Pipeline {self.failed} stage stopped making progress; giving up")
+        self.stop()
+
+    def poll(self):
+        """
+        Collect finished frames without blocking.
+
+        The caller owns the returned slots until it calls release().
+
+        Returns:
+            list: (slot, frame_id, timestamp, faces, results) tuples where
+            results holds (emotion, confidence) or None per face
+        """
+        now = time.monotonic()
+        if self.running and now - self.last_poll > 1.0:
+            # Nobody was consuming results, so a stall meanwhile is not the workers' fault
+            self._reset_watchdog(now + self.stall_timeout)
+        self.last_poll = now
+        self.supervise()
+        items = []
+        if not self.running:
+            return items
+        while True:
+            try:
+                item = self.inputs[MAIN].get_nowait()
+            except queue.Empty:
+                break
+            self.slot_owner[item[0]] = MAIN
+            items.append(item)
+        return items
+
+    def frame(self, slot):
+        """Zero-copy view of a slot's frame (valid until release)"""
+        return self.ring.frames[slot]
+
+    def release(self, slot):
+        """Return a slot to the capture process"""
+        self.slot_owner[slot] = FREE
+        self.inputs[CAPTURE].put(slot)
+
+    def get_stats(self):
+        """Counters for captured, dropped, detected and analyzed frames"""
+        if not self.running and self.ring is None:
+            return {}
+        return {
+            'captured': self.stats[STAT_CAPTURED],
+            'dropped': self.stats[STAT_DROPPED],
+            'detected': self.stats[STAT_DETECTED],
+            'analyzed': self.stats[STAT_ANALYZED],
+            'read_errors': self.stats[STAT_READ_ERRORS],
+            'restarts': self.restarts
+        }
+
+    def stop(self, timeout=3.0):
+        """Stop all workers and free the shared memory"""
+        if not self.running:
+            return
+        self.running = False
+        for stop_event in self.stop_events.values():
+            stop_event.set()
+        deadline = time.monotonic() + timeout
+        for process in self.workers.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+        for process in self.workers.values():
+            if process.is_alive():
+                self._terminate(process)
+        self.workers = {}
+        self.stop_events = {}
+        for q in self.inputs.values():
+            q.cancel_join_thread()
+            q.close()
+        self.inputs = {}
+        self.ring.close()
+        self.ring = None
\ No newline at end of file
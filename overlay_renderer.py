@@ -0,0 +1,214 @@
+import logging
+import os
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Color emoji fonts tried in order (Windows, macOS, Linux)
+EMOJI_FONTS = [
+    'seguiemj.ttf',
+    'C:/Windows/Fonts/seguiemj.ttf',
+    '/System/Library/Fonts/Apple Color Emoji.ttc',
+    '/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf',
+    '/usr/share/fonts/noto/NotoColorEmoji.ttf',
+    '/usr/share/fonts/google-noto-emoji/NotoColorEmoji.ttf'
+]
+
+# Bitmap emoji fonts only load at their strike size and are resized afterwards
+EMOJI_FONT_SIZES = (109, 160, 96, 64)
+
+class Sprite:
+    """Pre-rasterized overlay image with its blend weights"""
+
+    def __init__(self, bgr, alpha):
+        """
+        Args:
+            bgr: (h, w, 3) uint8 color
+            alpha: (h, w) uint8 coverage
+        """
+        alpha = cv2.merge([alpha, alpha, alpha])
+        # Premultiplied once here so blending is one multiply and one add per pixel
+        self.premultiplied = cv2.multiply(bgr, alpha, scale=1.0 / 255)
+        self.inverse_alpha = cv2.bitwise_not(alpha)
+        self.height, self.width = bgr.shape[:2]
+
+    def blend(self, frame, x, y):
+        """
+        Alpha-blend onto frame in place with the top-left corner at (x, y).
+
+        Only the region under the sprite is touched; parts outside the frame
+        are clipped.
+        """
+        fh, fw = frame.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + self.width, fw), min(y + self.height, fh)
+        if x0 >= x1 or y0 >= y1:
+            return
+        sx, sy = x0 - x, y0 - y
+        sw, sh = x1 - x0, y1 - y0
+        roi = frame[y0:y1, x0:x1]
+        # Saturating uint8 arithmetic writes straight back into the frame view
+        cv2.multiply(roi, self.inverse_alpha[sy:sy+sh, sx:sx+sw], dst=roi, scale=1.0 / 255)
+        cv2.add(roi, self.premultiplied[sy:sy+sh, sx:sx+sw], dst=roi)
+
+class OverlayRenderer:
+    """
+    Draws face annotations from cached sprites.
+
+    Label text and emoji are rasterized once per (emotion, confidence
+    bucket, scale) and alpha-blended onto the pixels they cover, instead of
+    running the text rasterizer for every face of every frame.
+    """
+
+    def __init__(self, colors, emojis, confidence_step=0.05, scale_step=0.25,
+                 base_face_size=160, max_sprites=256):
+        """
+        Args:
+            colors: Emotion -> BGR color
+            emojis: Emotion -> emoji character
+            confidence_step: Width of a confidence bucket; labels show the bucket value
+            scale_step: Granularity of the size-dependent sprite scale
+            base_face_size: Face width in pixels drawn at scale 1.0
+            max_sprites: Sprites kept before the least recently used are evicted
+        """
+        self.colors = dict(colors)
+        self.emojis = dict(emojis)
+        self.confidence_step = confidence_step
+        self.scale_step = scale_step
+        self.base_face_size = base_face_size
+        self.max_sprites = max_sprites
+        self.sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.emoji_font = None
+        self.emoji_font_size = 0
+        self.emoji_font_loaded = False
+
+    def color(self, emotion):
+        return self.colors.get(emotion, (128, 128, 128))
+
+    def scale_for(self, face_width):
+        """Quantized sprite scale for a face, so nearby sizes share sprites"""
+        scale = face_width / self.base_face_size
+        scale = round(scale / self.scale_step) * self.scale_step
+        return min(max(scale, 0.5), 2.0)
+
+    def confidence_bucket(self, confidence):
+        """Round a confidence down to its bucket"""
+        steps = int(confidence / self.confidence_step + 1e-6)
+        return round(steps * self.confidence_step, 4)
+
+    def _cached(self, key, build):
+        """Get a sprite from the LRU cache, building it on a miss"""
+        sprite = self.sprites.get(key)
+        if sprite is not None or key in self.sprites:
+            self.sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = build()
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def label_sprite(self, emotion, confidence, scale):
+        """Sprite for 'EMOTION (NN%)' in the emotion color"""
+        bucket = self.confidence_bucket(confidence)
+        return self._cached(('label', emotion, bucket, scale),
+                            lambda: self._build_label(f"{emotion.upper()} ({bucket:.0%})",
+                                                      self.color(emotion), scale))
+
+    def emoji_sprite(self, emotion, scale):
+        """Sprite for the emotion's emoji, or None if no emoji font is available"""
+        return self._cached(('emoji', emotion, scale), lambda: self._build_emoji(emotion, scale))
+
+    @staticmethod
+    def _build_label(text, color, scale):
+        font_scale = 0.9 * scale
+        thickness = max(1, int(round(2 * scale)))
+        (width, height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+        pad = thickness
+        # The text is drawn white on black; the result is its anti-aliased coverage
+        alpha = np.zeros((height + baseline + 2 * pad, width + 2 * pad), dtype=np.uint8)
+        cv2.putText(alpha, text, (pad, pad + height), cv2.FONT_HERSHEY_SIMPLEX, font_scale, 255,
+                    thickness, cv2.LINE_AA)
+        bgr = np.empty(alpha.shape + (3,), dtype=np.uint8)
+        bgr[:] = color
+        return Sprite(bgr, alpha)
+
+    def _load_emoji_font(self):
+        """Find a color emoji font once; Pillow is only needed for emoji"""
+        self.emoji_font_loaded = True
+        try:
+            from PIL import ImageFont
+        except ImportError:
+            logger.info("Pillow not available; emoji overlays disabled")
+            return
+        for path in EMOJI_FONTS:
+            if os.path.isabs(path) and not os.path.exists(path):
+                continue
+            for size in EMOJI_FONT_SIZES:
+                try:
+                    self.emoji_font = ImageFont.truetype(path, size)
+                    self.emoji_font_size = size
+                    return
+                except OSError:
+                    continue
+        logger.info("No color emoji font found; emoji overlays disabled")
+
+    def _build_emoji(self, emotion, scale):
+        if not self.emoji_font_loaded:
+            self._load_emoji_font()
+        emoji = self.emojis.get(emotion)
+        if self.emoji_font is None or not emoji:
+            return None
+        from PIL import Image, ImageDraw
+
+        size = self.emoji_font_size
+        image = Image.new('RGBA', (size * 2, size * 2), (0, 0, 0, 0))
+        try:
+            ImageDraw.Draw(image).text((0, 0), emoji, font=self.emoji_font, embedded_color=True)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Cannot render emoji for {emotion}: {str(e)}")
+            return None
+        box = image.getbbox()
+        if box is None:
+            return None
+        rgba = np.asarray(image.crop(box))
+
+        target = max(8, int(round(40 * scale)))
+        factor = target / max(rgba.shape[:2])
+        rgba = cv2.resize(rgba, (max(1, int(rgba.shape[1] * factor)), max(1, int(rgba.shape[0] * factor))),
+                          interpolation=cv2.INTER_AREA)
+        return Sprite(cv2.cvtColor(rgba[..., :3], cv2.COLOR_RGB2BGR), rgba[..., 3])
+
+    def draw(self, frame, box, emotion, confidence):
+        """
+        Annotate one analyzed face in place.
+
+        Args:
+            frame: BGR frame
+            box: Face box (x, y, w, h)
+            emotion: Emotion name
+            confidence: Confidence score
+        """
+        x, y, w, h = box
+        color = self.color(emotion)
+        scale = self.scale_for(w)
+        cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+
+        label = self.label_sprite(emotion, confidence, scale)
+        label.blend(frame, x, y - label.height)
+
+        emoji = self.emoji_sprite(emotion, scale)
+        if emoji is not None:
+            emoji.blend(frame, x + w + 10, y)
+
+    def draw_unknown(self, frame, box):
+        """Outline a face that has no usable result yet"""
+        x, y, w, h = box
+        cv2.rectangle(frame, (x, y), (x+w, y+h), self.color('unknown'), 1)
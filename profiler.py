@@ -0,0 +1,168 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from utils import unique_filename
+
+logger = logging.getLogger(__name__)
+
+class PipelineProfiler:
+    """
+    On-demand profiler for a running pipeline.
+
+    A background thread samples the stacks of all threads at a fixed
+    interval and writes them as collapsed stacks (flamegraph.pl / speedscope
+    format). Calls routed through profile_call() are also recorded with
+    cProfile. Both files go to the logs directory.
+    """
+
+    def __init__(self, directory='logs', interval=0.01):
+        """
+        Args:
+            directory: Output directory for profile files
+            interval: Seconds between stack samples
+        """
+        self.directory = directory
+        self.interval = interval
+        self.running = False
+        self.thread = None
+        self.stop_event = None
+        # Guards the run state below; whoever ends a run takes its data under
+        # the lock and writes the files outside it
+        self.lock = threading.Lock()
+        self.samples = Counter()
+        self.profile = None
+        self.started = None
+        self.last_files = []
+
+    def start(self, duration=None):
+        """
+        Start sampling.
+
+        Args:
+            duration: Seconds after which profiling stops and files are
+                written; None runs until stop()
+        """
+        with self.lock:
+            if self.running:
+                return
+            self.samples = Counter()
+            self.profile = cProfile.Profile()
+            # Each run gets its own event so a finishing sampler is never revived
+            self.stop_event = threading.Event()
+            self.started = time.monotonic()
+            self.running = True
+            deadline = None if duration is None else self.started + duration
+            self.thread = threading.Thread(target=self._run, args=(deadline, self.stop_event, self.samples),
+                                           name='PipelineProfiler', daemon=True)
+            self.thread.start()
+        logger.info("Profiling started" + (f" for {duration:.0f} s" if duration else ""))
+
+    def stop(self):
+        """
+        Stop sampling and write the profile files.
+
+        Returns:
+            list: Paths of the files written (empty if not running)
+        """
+        with self.lock:
+            if not self.running:
+                return []
+            thread, run = self._finish()
+            self.stop_event.set()
+        if thread is not threading.current_thread():
+            thread.join()
+        return self._write(*run)
+
+    def toggle(self, duration=None):
+        """Start profiling, or stop it and write the files if it is running"""
+        if self.running:
+            return self.stop()
+        self.start(duration)
+        return []
+
+    def profile_call(self, func, *args, **kwargs):
+        """Call func, recording it with cProfile while profiling is active"""
+        if not self.running:
+            return func(*args, **kwargs)
+        with self.lock:
+            if self.profile is None:
+                return func(*args, **kwargs)
+            return self.profile.runcall(func, *args, **kwargs)
+
+    def _finish(self):
+        """
+        End the current run; the caller holds the lock.
+
+        Returns:
+            tuple: (sampler thread, (samples, profile, started) to write)
+        """
+        thread, self.thread = self.thread, None
+        profile, self.profile = self.profile, None
+        self.running = False
+        return thread, (self.samples, profile, self.started)
+
+    def _run(self, deadline, stop_event, samples):
+        """Sampler loop"""
+        own_id = threading.get_ident()
+        while not stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    samples[self._collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                # Time is up: finish from this thread so callers need not poll,
+                # unless stop() ended the run first
+                with self.lock:
+                    if self.thread is not threading.current_thread():
+                        return
+                    _, run = self._finish()
+                self._write(*run)
+                return
+
+    @staticmethod
+    def _collapse(thread_name, frame):
+        """Render a stack as 'thread;outer;...;inner' with file:line per frame"""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            name = getattr(code, 'co_qualname', code.co_name)
+            stack.append(f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        stack.append(thread_name)
+        return ';'.join(reversed(stack)).replace('\n', ' ')
+
+    def _write(self, samples, profile, started):
+        """Write collapsed stacks and the cProfile dump of one finished run"""
+        os.makedirs(self.directory, exist_ok=True)
+        stem = os.path.splitext(unique_filename(self.directory, 'profile', 'folded'))[0]
+        files = []
+
+        folded = f"{stem}.folded"
+        with open(folded, 'w', encoding='utf-8') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        files.append(folded)
+
+        if profile is not None:
+            profile.create_stats()
+            if profile.stats:
+                dump = f"{stem}_process_frame.prof"
+                profile.dump_stats(dump)
+                files.append(dump)
+
+                summary = io.StringIO()
+                pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(15)
+                logger.info(f"process_frame profile:\n{summary.getvalue()}")
+
+        elapsed = time.monotonic() - started
+        logger.info(f"Profiling stopped after {elapsed:.1f} s, "
+                    f"{sum(samples.values())} samples: {', '.join(files)}")
+        self.last_files = files
+        return files
@@ -0,0 +1,275 @@
+import json
+import logging
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('main', 'capture', 'detect', 'infer')
+
+# The configuration applied in this process; threads pin themselves from it
+ACTIVE = None
+
+def available_cpus():
+    """CPUs this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def parse_affinity(text):
+    """
+    Parse 'capture=0;detect=1;infer=2,3' into {'capture': [0], ...}.
+
+    Blank text means no pinning.
+    """
+    affinity = {}
+    for part in str(text or '').split(';'):
+        if not part.strip():
+            continue
+        stage, _, cpus = part.partition('=')
+        stage = stage.strip().lower()
+        if stage not in STAGES:
+            raise ValueError(f"Unknown pipeline stage {stage!r}; expected one of {', '.join(STAGES)}")
+        affinity[stage] = [int(cpu) for cpu in cpus.split(',') if cpu.strip()]
+    return affinity
+
+class ResourceConfig:
+    """Thread pool sizes and CPU affinity for TensorFlow, OpenCV and pipeline stages"""
+
+    def __init__(self, tf_intra_threads=0, tf_inter_threads=0, cv_threads=-1, affinity=None,
+                 name='custom'):
+        """
+        Args:
+            tf_intra_threads: Threads TensorFlow uses inside one op (0 = TF default)
+            tf_inter_threads: Ops TensorFlow runs concurrently (0 = TF default)
+            cv_threads: OpenCV thread pool size (-1 = OpenCV default, 1 = no pool)
+            affinity: Optional stage -> list of CPUs, see parse_affinity
+            name: Label used in logs
+        """
+        self.tf_intra_threads = int(tf_intra_threads)
+        self.tf_inter_threads = int(tf_inter_threads)
+        self.cv_threads = int(cv_threads)
+        self.affinity = dict(affinity or {})
+        self.name = name
+
+    @classmethod
+    def for_quality(cls, quality, cpu_count=None, affinity=None):
+        """
+        Preset for a detection_quality setting.
+
+        The presets split the cores so TensorFlow, OpenCV and the Qt main
+        thread together do not ask for more threads than there are cores:
+        'performance' keeps per-frame latency low with a single-threaded
+        cascade, 'balanced' shares the remaining cores with OpenCV and
+        'quality' lets both pools use all cores for throughput.
+        """
+        cores = cpu_count or len(available_cpus())
+        if quality == 'performance':
+            return cls(max(1, cores // 2), 1, 1, affinity, 'performance')
+        if quality == 'quality':
+            return cls(max(1, cores - 1), 2, max(1, cores - 1), affinity, 'quality')
+        intra = max(1, cores // 2)
+        return cls(intra, 1, max(1, cores - intra - 1), affinity, 'balanced')
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'tf_intra_threads': self.tf_intra_threads,
+            'tf_inter_threads': self.tf_inter_threads,
+            'cv_threads': self.cv_threads,
+            'affinity': self.affinity
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('tf_intra_threads', 0), data.get('tf_inter_threads', 0),
+                   data.get('cv_threads', -1), data.get('affinity'), data.get('name', 'custom'))
+
+    def __repr__(self):
+        return (f"ResourceConfig({self.name}: tf {self.tf_intra_threads}/{self.tf_inter_threads}, "
+                f"cv {self.cv_threads}, affinity {self.affinity or 'none'})")
+
+    def apply(self, stage='main'):
+        """
+        Apply the configuration to this process and pin the calling thread.
+
+        Must run before the emotion model is loaded: TensorFlow fixes its
+        thread pools when it initializes.
+
+        Args:
+            stage: Pipeline stage the calling thread belongs to
+        """
+        global ACTIVE
+        ACTIVE = self
+
+        # TensorFlow reads these when it creates its pools; setting them keeps
+        # thin clients from importing TensorFlow just to configure it
+        if self.tf_intra_threads:
+            os.environ['TF_NUM_INTRAOP_THREADS'] = str(self.tf_intra_threads)
+        if self.tf_inter_threads:
+            os.environ['TF_NUM_INTEROP_THREADS'] = str(self.tf_inter_threads)
+        if 'tensorflow' in sys.modules:
+            tf = sys.modules['tensorflow']
+            try:
+                if self.tf_intra_threads:
+                    tf.config.threading.set_intra_op_parallelism_threads(self.tf_intra_threads)
+                if self.tf_inter_threads:
+                    tf.config.threading.set_inter_op_parallelism_threads(self.tf_inter_threads)
+            except (RuntimeError, AttributeError) as e:
+                logger.warning(f"TensorFlow thread settings not applied: {str(e)}")
+
+        if self.cv_threads >= 0:
+            cv2.setNumThreads(self.cv_threads)
+        self.pin(stage)
+        logger.info(f"Applied {self!r} for stage {stage}")
+
+    def pin(self, stage):
+        """Restrict the calling thread to the CPUs configured for a stage"""
+        cpus = self.affinity.get(stage)
+        if not cpus:
+            return
+        if not hasattr(os, 'sched_setaffinity'):
+            logger.debug("CPU affinity is not supported on this platform")
+            return
+        try:
+            # On Linux pid 0 means the calling thread; threads it starts inherit the mask
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            logger.warning(f"Cannot pin {stage} to CPUs {cpus}: {str(e)}")
+
+def pin_current_thread(stage):
+    """Pin the calling thread using the active configuration, if any"""
+    if ACTIVE is not None:
+        ACTIVE.pin(stage)
+
+def _benchmark_worker(config, iterations, results):
+    """Time detection plus batched inference on synthetic data in a fresh process"""
+    try:
+        config.apply('infer')
+        from emotion_analyzer import EmotionAnalyzer
+        from face_detector import FaceDetector
+        from frame_context import FrameContext
+
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+        faces = [rng.integers(0, 256, (96, 96), dtype=np.uint8) for _ in range(4)]
+        detector, analyzer = FaceDetector(), EmotionAnalyzer()
+
+        timings = []
+        for i in range(iterations + 2):
+            start = time.perf_counter()
+            detector.detect(FrameContext(frame))
+            analyzer.predict_scores_batch(faces)
+            if i >= 2:  # The first runs include model loading and warmup
+                timings.append(time.perf_counter() - start)
+        results.put(float(np.median(timings)))
+    except Exception as e:
+        results.put(f"{type(e).__name__}: {str(e)}")
+
+def benchmark(config, iterations=20, timeout=180.0):
+    """
+    Measure the median frame time of a configuration.
+
+    Each run uses a fresh process because TensorFlow's thread pools cannot
+    be resized once created.
+
+    Returns:
+        float: Seconds per frame, or infinity if the run failed
+    """
+    ctx = mp.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=_benchmark_worker, args=(config, iterations, results), daemon=True)
+    process.start()
+    try:
+        result = results.get(timeout=timeout)
+    except Exception:
+        result = 'timed out'
+    process.join(5.0)
+    if process.is_alive():
+        process.terminate()
+    if isinstance(result, str):
+        logger.warning(f"Benchmark of {config!r} failed: {result}")
+        return float('inf')
+    return result
+
+def autotune(candidates, iterations=20):
+    """
+    Benchmark candidate configurations and return the fastest.
+
+    Returns:
+        tuple: (best config or None if every run failed, [(config, seconds)])
+    """
+    results = []
+    for config in candidates:
+        seconds = benchmark(config, iterations)
+        logger.info(f"Autotune {config!r}: {seconds * 1000:.1f} ms per frame")
+        results.append((config, seconds))
+    best = min(results, key=lambda r: r[1]) if results else None
+    if best is None or best[1] == float('inf'):
+        return None, results
+    return best[0], results
+
+def _autotune_in_background(settings, candidates, cores):
+    """
+    Benchmark candidates on a daemon thread and store the winner in settings.
+
+    Thread pools are sized once per process, so the result only takes
+    effect from the next start.
+    """
+    def run():
+        best, _ = autotune(candidates)
+        if best is None:
+            logger.warning("Autotune failed for every configuration; keeping the preset")
+            return
+        settings.set('resource_autotuned', json.dumps({'cpus': cores, 'config': best.to_dict()}))
+        logger.info(f"Autotune picked {best!r}; it applies from the next start")
+
+    thread = threading.Thread(target=run, name='ResourceAutotune', daemon=True)
+    thread.start()
+    return thread
+
+def configure_from_settings(settings):
+    """
+    Pick and apply the resource configuration selected in settings.
+
+    'preset' uses the detection_quality preset, 'autotune' uses the winner
+    of a per-machine benchmark of the presets, 'off' leaves all libraries at
+    their defaults. Until the benchmark has run, autotune starts with the
+    preset and benchmarks in the background without delaying startup.
+
+    Returns:
+        ResourceConfig: The applied configuration, or None when off
+    """
+    mode = settings.get('resource_mode', 'preset')
+    if mode == 'off':
+        return None
+    try:
+        affinity = parse_affinity(settings.get('cpu_affinity', ''))
+    except ValueError as e:
+        logger.warning(f"Ignoring CPU affinity setting: {str(e)}")
+        affinity = {}
+    quality = settings.get('detection_quality', 'balanced')
+    config = ResourceConfig.for_quality(quality, affinity=affinity)
+
+    if mode == 'autotune':
+        cores = len(available_cpus())
+        cached = settings.get('resource_autotuned', '')
+        data = json.loads(cached) if cached else {}
+        if data.get('cpus') == cores:
+            config = ResourceConfig.from_dict(data['config'])
+            config.affinity = affinity
+        else:
+            candidates = [ResourceConfig.for_quality(q, cores, affinity)
+                          for q in ('performance', 'balanced', 'quality')]
+            logger.info(f"Autotuning thread configuration in the background; using the {quality} preset "
+                        f"until the next start")
+            _autotune_in_background(settings, candidates, cores)
+
+    config.apply('main')
+    return config
@@ -1,5 +1,5 @@
 from PyQt5.QtCore import QSettings, QObject, pyqtSignal
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QCheckBox, QPushButton, QSpinBox, QGroupBox
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QCheckBox, QPushButton, QSpinBox, QGroupBox, QLineEdit
 
 class Settings(QObject):
     """Application settings manager"""
@@ -20,7 +20,30 @@ class Settings(QObject):
             'save_screenshots': True,
             'emotion_smoothing': 2,
             'min_face_size': 30,
-            'detection_quality': 'balanced'  # balanced, performance, quality
+            'quality_gating': True,
+            'min_sharpness': 20,  # Laplacian variance of a 64x64 face thumbnail
+            'motion_gating': False,
+            'motion_heartbeat': 1000,  # ms between full runs on a static scene
+            'detection_quality': 'balanced',  # balanced, performance, quality
+            'screenshot_format': 'jpg',  # jpg, webp, png
+            'screenshot_quality': 90,
+            'screenshot_full_resolution': False,
+            'clip_recording': False,
+            'clip_trigger_emotions': 'angry',  # comma separated
+            'clip_pre_roll': 3,  # seconds
+            'clip_post_roll': 3,  # seconds
+            'inference_server': '',  # blank for local inference, else http://host:port
+            'inference_batching': 'off',  # off, latency, balanced, throughput
+            'memory_budget_mb': 0,  # 0 for unlimited
+            'pipeline_mode': 'threaded',  # threaded, multiprocess
+            'capture_width': 0,  # 0 keeps the camera default
+            'capture_height': 0,
+            'capture_fps': 0,
+            'capture_mjpg': False,
+            'capture_buffer_size': 1,  # frames buffered by the driver
+            'dashboard_window': 300,  # seconds of history in the mood dashboard
+            'resource_mode': 'preset',  # off, preset (from detection_quality), autotune
+            'cpu_affinity': ''  # e.g. capture=0;detect=1;infer=2,3
         }
         
         for key, value in defaults.items():
@@ -31,11 +54,24 @@ class Settings(QObject):
         """Get setting value"""
         return self.settings.value(key, default)
 
+    def get_bool(self, key, default=False):
+        """Get boolean setting value (QSettings may store booleans as strings)"""
+        value = self.settings.value(key, default)
+        if isinstance(value, str):
+            return value.lower() == 'true'
+        return bool(value)
+
     def set(self, key, value):
         """Set setting value"""
         self.settings.setValue(key, value)
         self.settings_changed.emit()
 
+    def update(self, values):
+        """Set several values and notify listeners once"""
+        for key, value in values.items():
+            self.settings.setValue(key, value)
+        self.settings_changed.emit()
+
     def reset(self):
         """Reset all settings to defaults"""
         self.settings.clear()
@@ -78,8 +114,40 @@ class SettingsDialog(QDialog):
         self.camera_spin.setRange(0, 10)
         self.camera_spin.setValue(int(self.settings.get('camera_index')))
         
+        resolution_label = QLabel("Resolution (0 = camera default):")
+        resolution_layout = QHBoxLayout()
+        self.width_spin = QSpinBox()
+        self.width_spin.setRange(0, 3840)
+        self.width_spin.setValue(int(self.settings.get('capture_width')))
+        self.height_spin = QSpinBox()
+        self.height_spin.setRange(0, 2160)
+        self.height_spin.setValue(int(self.settings.get('capture_height')))
+        resolution_layout.addWidget(self.width_spin)
+        resolution_layout.addWidget(QLabel("x"))
+        resolution_layout.addWidget(self.height_spin)
+        
+        capture_fps_label = QLabel("Frame Rate (0 = camera default):")
+        self.capture_fps_spin = QSpinBox()
+        self.capture_fps_spin.setRange(0, 120)
+        self.capture_fps_spin.setValue(int(self.settings.get('capture_fps')))
+        
+        self.mjpg_check = QCheckBox("Request MJPG from the camera")
+        self.mjpg_check.setChecked(self.settings.get_bool('capture_mjpg'))
+        
+        buffer_label = QLabel("Driver Buffer Size (frames):")
+        self.buffer_spin = QSpinBox()
+        self.buffer_spin.setRange(0, 10)
+        self.buffer_spin.setValue(int(self.settings.get('capture_buffer_size')))
+        
         camera_layout.addWidget(camera_label)
         camera_layout.addWidget(self.camera_spin)
+        camera_layout.addWidget(resolution_label)
+        camera_layout.addLayout(resolution_layout)
+        camera_layout.addWidget(capture_fps_label)
+        camera_layout.addWidget(self.capture_fps_spin)
+        camera_layout.addWidget(self.mjpg_check)
+        camera_layout.addWidget(buffer_label)
+        camera_layout.addWidget(self.buffer_spin)
         camera_group.setLayout(camera_layout)
         layout.addWidget(camera_group)
 
@@ -100,14 +168,160 @@ class SettingsDialog(QDialog):
         self.show_fps_check = QCheckBox("Show FPS")
         self.show_fps_check.setChecked(self.settings.get('show_fps') == 'true')
         
+        self.gating_check = QCheckBox("Skip small, blurred or badly exposed faces")
+        self.gating_check.setChecked(self.settings.get_bool('quality_gating', True))
+        
+        face_size_label = QLabel("Minimum Face Size (px):")
+        self.face_size_spin = QSpinBox()
+        self.face_size_spin.setRange(10, 300)
+        self.face_size_spin.setValue(int(self.settings.get('min_face_size')))
+        
+        sharpness_label = QLabel("Minimum Face Sharpness:")
+        self.sharpness_spin = QSpinBox()
+        self.sharpness_spin.setRange(0, 1000)
+        self.sharpness_spin.setValue(int(self.settings.get('min_sharpness')))
+        
         detection_layout.addWidget(quality_label)
         detection_layout.addWidget(self.quality_combo)
         detection_layout.addWidget(interval_label)
         detection_layout.addWidget(self.interval_spin)
         detection_layout.addWidget(self.show_fps_check)
+        detection_layout.addWidget(self.gating_check)
+        detection_layout.addWidget(face_size_label)
+        detection_layout.addWidget(self.face_size_spin)
+        self.motion_check = QCheckBox("Idle when the scene is static")
+        self.motion_check.setChecked(self.settings.get_bool('motion_gating'))
+        
+        heartbeat_label = QLabel("Static Scene Refresh Interval (ms):")
+        self.heartbeat_spin = QSpinBox()
+        self.heartbeat_spin.setRange(100, 10000)
+        self.heartbeat_spin.setSingleStep(100)
+        self.heartbeat_spin.setValue(int(self.settings.get('motion_heartbeat')))
+        
+        detection_layout.addWidget(sharpness_label)
+        detection_layout.addWidget(self.sharpness_spin)
+        detection_layout.addWidget(self.motion_check)
+        detection_layout.addWidget(heartbeat_label)
+        detection_layout.addWidget(self.heartbeat_spin)
         detection_group.setLayout(detection_layout)
         layout.addWidget(detection_group)
 
+        # Screenshot settings
+        screenshot_group = QGroupBox("Screenshots")
+        screenshot_layout = QVBoxLayout()
+        
+        format_label = QLabel("Image Format:")
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(['jpg', 'webp', 'png'])
+        self.format_combo.setCurrentText(self.settings.get('screenshot_format'))
+        
+        image_quality_label = QLabel("Image Quality (JPEG/WebP):")
+        self.image_quality_spin = QSpinBox()
+        self.image_quality_spin.setRange(1, 100)
+        self.image_quality_spin.setValue(int(self.settings.get('screenshot_quality')))
+        
+        self.full_resolution_check = QCheckBox("Save full-resolution source frames (no overlays)")
+        self.full_resolution_check.setChecked(self.settings.get_bool('screenshot_full_resolution'))
+        
+        screenshot_layout.addWidget(format_label)
+        screenshot_layout.addWidget(self.format_combo)
+        screenshot_layout.addWidget(image_quality_label)
+        screenshot_layout.addWidget(self.image_quality_spin)
+        screenshot_layout.addWidget(self.full_resolution_check)
+        screenshot_group.setLayout(screenshot_layout)
+        layout.addWidget(screenshot_group)
+
+        # Clip recording settings
+        clip_group = QGroupBox("Clip Recording")
+        clip_layout = QVBoxLayout()
+        
+        self.clip_check = QCheckBox("Record clips on emotion changes")
+        self.clip_check.setChecked(self.settings.get_bool('clip_recording'))
+        
+        trigger_label = QLabel("Trigger Emotions (comma separated):")
+        self.trigger_edit = QLineEdit(self.settings.get('clip_trigger_emotions'))
+        
+        pre_roll_label = QLabel("Seconds Before Trigger:")
+        self.pre_roll_spin = QSpinBox()
+        self.pre_roll_spin.setRange(0, 30)
+        self.pre_roll_spin.setValue(int(self.settings.get('clip_pre_roll')))
+        
+        post_roll_label = QLabel("Seconds After Trigger:")
+        self.post_roll_spin = QSpinBox()
+        self.post_roll_spin.setRange(1, 30)
+        self.post_roll_spin.setValue(int(self.settings.get('clip_post_roll')))
+        
+        clip_layout.addWidget(self.clip_check)
+        clip_layout.addWidget(trigger_label)
+        clip_layout.addWidget(self.trigger_edit)
+        clip_layout.addWidget(pre_roll_label)
+        clip_layout.addWidget(self.pre_roll_spin)
+        clip_layout.addWidget(post_roll_label)
+        clip_layout.addWidget(self.post_roll_spin)
+        clip_group.setLayout(clip_layout)
+        layout.addWidget(clip_group)
+
+        # Inference settings
+        inference_group = QGroupBox("Inference")
+        inference_layout = QVBoxLayout()
+        
+        server_label = QLabel("Inference Server URL (blank for local):")
+        self.server_edit = QLineEdit(self.settings.get('inference_server'))
+        self.server_edit.setPlaceholderText("http://127.0.0.1:8765")
+        
+        batching_label = QLabel("Batch Inference:")
+        self.batching_combo = QComboBox()
+        self.batching_combo.addItems(['off', 'latency', 'balanced', 'throughput'])
+        self.batching_combo.setCurrentText(self.settings.get('inference_batching'))
+        
+        inference_layout.addWidget(server_label)
+        inference_layout.addWidget(self.server_edit)
+        pipeline_label = QLabel("Pipeline Mode:")
+        self.pipeline_combo = QComboBox()
+        self.pipeline_combo.addItems(['threaded', 'multiprocess'])
+        self.pipeline_combo.setCurrentText(self.settings.get('pipeline_mode'))
+        
+        inference_layout.addWidget(batching_label)
+        inference_layout.addWidget(self.batching_combo)
+        inference_layout.addWidget(pipeline_label)
+        inference_layout.addWidget(self.pipeline_combo)
+        inference_group.setLayout(inference_layout)
+        layout.addWidget(inference_group)
+
+        # Memory settings
+        memory_group = QGroupBox("Memory")
+        memory_layout = QVBoxLayout()
+        
+        budget_label = QLabel("Memory Budget for Buffers (MB, 0 = unlimited):")
+        self.budget_spin = QSpinBox()
+        self.budget_spin.setRange(0, 8192)
+        self.budget_spin.setValue(int(self.settings.get('memory_budget_mb')))
+        
+        memory_layout.addWidget(budget_label)
+        memory_layout.addWidget(self.budget_spin)
+        memory_group.setLayout(memory_layout)
+        layout.addWidget(memory_group)
+
+        # CPU resource settings (thread pools are sized at startup)
+        resource_group = QGroupBox("Performance (applies after restart)")
+        resource_layout = QVBoxLayout()
+        
+        resource_label = QLabel("Thread Configuration:")
+        self.resource_combo = QComboBox()
+        self.resource_combo.addItems(['preset', 'autotune', 'off'])
+        self.resource_combo.setCurrentText(self.settings.get('resource_mode'))
+        
+        affinity_label = QLabel("CPU Affinity per Stage (blank for none):")
+        self.affinity_edit = QLineEdit(self.settings.get('cpu_affinity'))
+        self.affinity_edit.setPlaceholderText("capture=0;detect=1;infer=2,3")
+        
+        resource_layout.addWidget(resource_label)
+        resource_layout.addWidget(self.resource_combo)
+        resource_layout.addWidget(affinity_label)
+        resource_layout.addWidget(self.affinity_edit)
+        resource_group.setLayout(resource_layout)
+        layout.addWidget(resource_group)
+
         # Buttons
         button_layout = QHBoxLayout()
         save_button = QPushButton("Save")
@@ -125,11 +339,37 @@ class SettingsDialog(QDialog):
 
     def save_settings(self):
         """Save current settings"""
-        self.settings.set('theme', self.theme_combo.currentText())
-        self.settings.set('camera_index', self.camera_spin.value())
-        self.settings.set('detection_quality', self.quality_combo.currentText())
-        self.settings.set('detection_interval', self.interval_spin.value())
-        self.settings.set('show_fps', str(self.show_fps_check.isChecked()))
+        # One write and one change notification, so listeners reconfigure once per Save
+        self.settings.update({
+            'theme': self.theme_combo.currentText(),
+            'camera_index': self.camera_spin.value(),
+            'capture_width': self.width_spin.value(),
+            'capture_height': self.height_spin.value(),
+            'capture_fps': self.capture_fps_spin.value(),
+            'capture_mjpg': str(self.mjpg_check.isChecked()),
+            'capture_buffer_size': self.buffer_spin.value(),
+            'detection_quality': self.quality_combo.currentText(),
+            'detection_interval': self.interval_spin.value(),
+            'show_fps': str(self.show_fps_check.isChecked()),
+            'quality_gating': str(self.gating_check.isChecked()),
+            'min_face_size': self.face_size_spin.value(),
+            'min_sharpness': self.sharpness_spin.value(),
+            'motion_gating': str(self.motion_check.isChecked()),
+            'motion_heartbeat': self.heartbeat_spin.value(),
+            'screenshot_format': self.format_combo.currentText(),
+            'screenshot_quality': self.image_quality_spin.value(),
+            'screenshot_full_resolution': str(self.full_resolution_check.isChecked()),
+            'clip_recording': str(self.clip_check.isChecked()),
+            'clip_trigger_emotions': self.trigger_edit.text(),
+            'clip_pre_roll': self.pre_roll_spin.value(),
+            'clip_post_roll': self.post_roll_spin.value(),
+            'inference_server': self.server_edit.text().strip(),
+            'inference_batching': self.batching_combo.currentText(),
+            'pipeline_mode': self.pipeline_combo.currentText(),
+            'memory_budget_mb': self.budget_spin.value(),
+            'resource_mode': self.resource_combo.currentText(),
+            'cpu_affinity': self.affinity_edit.text().strip()
+        })
         self.accept()
 
     def reset_settings(self):
@@ -139,4 +379,27 @@ class SettingsDialog(QDialog):
         self.camera_spin.setValue(int(self.settings.get('camera_index')))
         self.quality_combo.setCurrentText(self.settings.get('detection_quality'))
         self.interval_spin.setValue(int(self.settings.get('detection_interval')))
-        self.show_fps_check.setChecked(self.settings.get('show_fps') == 'true') 
\ No newline at end of file
+        self.show_fps_check.setChecked(self.settings.get('show_fps') == 'true')
+        self.format_combo.setCurrentText(self.settings.get('screenshot_format'))
+        self.image_quality_spin.setValue(int(self.settings.get('screenshot_quality')))
+        self.full_resolution_check.setChecked(self.settings.get_bool('screenshot_full_resolution'))
+        self.clip_check.setChecked(self.settings.get_bool('clip_recording'))
+        self.trigger_edit.setText(self.settings.get('clip_trigger_emotions'))
+        self.pre_roll_spin.setValue(int(self.settings.get('clip_pre_roll')))
+        self.post_roll_spin.setValue(int(self.settings.get('clip_post_roll')))
+        self.server_edit.setText(self.settings.get('inference_server'))
+        self.batching_combo.setCurrentText(self.settings.get('inference_batching'))
+        self.budget_spin.setValue(int(self.settings.get('memory_budget_mb')))
+        self.gating_check.setChecked(self.settings.get_bool('quality_gating', True))
+        self.face_size_spin.setValue(int(self.settings.get('min_face_size')))
+        self.sharpness_spin.setValue(int(self.settings.get('min_sharpness')))
+        self.motion_check.setChecked(self.settings.get_bool('motion_gating'))
+        self.heartbeat_spin.setValue(int(self.settings.get('motion_heartbeat')))
+        self.pipeline_combo.setCurrentText(self.settings.get('pipeline_mode'))
+        self.width_spin.setValue(int(self.settings.get('capture_width')))
+        self.height_spin.setValue(int(self.settings.get('capture_height')))
+        self.capture_fps_spin.setValue(int(self.settings.get('capture_fps')))
+        self.mjpg_check.setChecked(self.settings.get_bool('capture_mjpg'))
+        self.buffer_spin.setValue(int(self.settings.get('capture_buffer_size')))
+        self.resource_combo.setCurrentText(self.settings.get('resource_mode'))
+        self.affinity_edit.setText(self.settings.get('cpu_affinity'))
\ No newline at end of file
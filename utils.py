@@ -1,27 +1,33 @@
 import os
+import sys
 import cv2
 import pandas as pd
 from datetime import datetime
 import matplotlib.pyplot as plt
 from PIL import Image
 import numpy as np
+import itertools
+import csv
+import logging
+from collections import deque
+
+# Process-wide sequence number so filenames never collide within a timestamp
+_filename_counter = itertools.count()
+
+logger = logging.getLogger(__name__)
 
 def create_directories():
     """Create necessary directories if they don't exist."""
-    directories = ['logs', 'screenshots']
+    directories = ['logs', 'screenshots', 'clips']
     for directory in directories:
         if not os.path.exists(directory):
             os.makedirs(directory)
 
-def save_screenshot(frame, emotion=None):
-    """Save a screenshot with timestamp and emotion label."""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"screenshots/screenshot_{timestamp}"
-    if emotion:
-        filename += f"_{emotion}"
-    filename += ".jpg"
-    cv2.imwrite(filename, frame)
-    return filename
+def unique_filename(directory, prefix, extension, suffix=''):
+    """Build a timestamped filename that is unique even within the same second."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    sequence = next(_filename_counter)
+    return os.path.join(directory, f"{prefix}_{timestamp}_{sequence:04d}{suffix}.{extension}")
 
 def log_emotion(emotion, confidence):
     """Log emotion data to CSV file."""
@@ -41,6 +47,84 @@ def log_emotion(emotion, confidence):
     else:
         df.to_csv(log_file, index=False)
 
+class EmotionCounter:
+    """Per-emotion counters held in a fixed NumPy array."""
+    def __init__(self, emotions):
+        self.emotions = list(emotions)
+        self.index = {emotion: i for i, emotion in enumerate(self.emotions)}
+        self.values = np.zeros(len(self.emotions), dtype=np.int64)
+
+    def increment(self, emotion, amount=1):
+        """Add to an emotion's count; unknown emotions are ignored."""
+        i = self.index.get(emotion)
+        if i is not None:
+            self.values[i] += amount
+
+    def counts(self):
+        """Return counts as an emotion -> int dict."""
+        return {emotion: int(self.values[i]) for emotion, i in self.index.items()}
+
+    def reset(self):
+        """Zero all counters."""
+        self.values.fill(0)
+
+class EmotionLog:
+    """Buffered CSV emotion log with size-based rotation."""
+    def __init__(self, log_file='logs/emotion_log.csv', max_bytes=10 * 1024 * 1024,
+                 backups=3, flush_rows=200, max_buffered=2000):
+        self.log_file = log_file
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_rows = flush_rows
+        # Bounded so a failing disk cannot make the buffer grow forever
+        self.rows = deque(maxlen=max_buffered)
+
+    def log(self, emotion, confidence, timestamp=None):
+        """Buffer one emotion record, flushing once enough rows are pending."""
+        self.rows.append((timestamp or datetime.now(), emotion, f"{confidence:.4f}"))
+        if len(self.rows) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        """Append buffered rows to the log, rotating it when too large."""
+        if not self.rows:
+            return
+        try:
+            if os.path.exists(self.log_file) and os.path.getsize(self.log_file) >= self.max_bytes:
+                self.rotate()
+            write_header = not os.path.exists(self.log_file)
+            with open(self.log_file, 'a', newline='') as f:
+                writer = csv.writer(f)
+                if write_header:
+                    writer.writerow(['timestamp', 'emotion', 'confidence'])
+                while self.rows:
+                    writer.writerow(self.rows.popleft())
+        except OSError as e:
+            logger.error(f"Error writing emotion log: {str(e)}")
+
+    def rotate(self):
+        """Shift emotion_log.csv -> emotion_log.csv.1 -> ... dropping the oldest."""
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.log_file}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.log_file}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.log_file, f"{self.log_file}.1")
+        else:
+            os.remove(self.log_file)
+
+def get_rss_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        # Fall back to peak RSS where /proc is unavailable
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
 def generate_emotion_report():
     """Generate a report of emotion statistics."""
     log_file = 'logs/emotion_log.csv'